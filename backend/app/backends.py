@@ -0,0 +1,248 @@
+import glob
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import AbstractContextManager, contextmanager
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from fastapi import HTTPException
+
+from .config import get_settings
+
+settings = get_settings()
+
+# Keys S3Backend remembers as present; misses are never remembered since another process may upload them.
+KNOWN_KEYS = 4096
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: float
+
+
+class StorageBackend(ABC):
+    """Where committed media objects live; keys are "/"-separated paths relative to the store root."""
+
+    public_base: str
+
+    def url(self, key: str) -> str:
+        return f"{self.public_base.rstrip('/')}/{key}"
+
+    @abstractmethod
+    def put(self, source: Path, key: str):
+        """Move the local file ``source`` to ``key``; ``source`` is consumed."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int | None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove ``key`` together with its "<key>.*" siblings (image variants, pre-encoded copies)."""
+
+    @abstractmethod
+    def remove(self, keys: list[str]):
+        """Remove exactly ``keys``; missing ones are ignored."""
+
+    @abstractmethod
+    def iter_objects(self) -> Iterator[StoredObject]:
+        """Stream every stored object; dot-prefixed entries (staging, journals) are skipped."""
+
+    @abstractmethod
+    def local_copy(self, key: str) -> AbstractContextManager[Path]:
+        """A local path holding ``key``; files written next to it are published by ``publish_siblings``."""
+
+    def publish_siblings(self, path: Path, key: str):
+        pass
+
+    def presign_upload(self, key: str, max_bytes: int, content_type: str | None) -> dict:
+        raise HTTPException(status_code=409, detail="Direct uploads need STORAGE_MODE=s3")
+
+
+class LocalBackend(StorageBackend):
+    def __init__(self, root: Path, public_base: str):
+        self.root = root
+        self.public_base = public_base
+
+    def put(self, source: Path, key: str):
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).is_file()
+
+    def size(self, key: str) -> int | None:
+        try:
+            return (self.root / key).stat().st_size
+        except OSError:
+            return None
+
+    def delete(self, key: str):
+        path = self.root / key
+        for target in [path, *path.parent.glob(f"{glob.escape(path.name)}.*")]:
+            if target.is_file():
+                try:
+                    target.unlink()
+                except OSError:
+                    pass
+
+    def remove(self, keys: list[str]):
+        for key in keys:
+            try:
+                (self.root / key).unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        pending = [(self.root, "")]
+        while pending:
+            directory, prefix = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, f"{prefix}{entry.name}/"))
+                    elif entry.is_file(follow_symlinks=False):
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        yield StoredObject(f"{prefix}{entry.name}", stat.st_size, stat.st_mtime)
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        yield self.root / key
+
+
+class S3Backend(StorageBackend):
+    """S3-compatible bucket (AWS, MinIO, ...) addressed through boto3."""
+
+    def __init__(self):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = settings.s3_bucket
+        if settings.s3_public_url:
+            self.public_base = settings.s3_public_url
+        elif settings.s3_endpoint_url:
+            self.public_base = f"{settings.s3_endpoint_url.rstrip('/')}/{self.bucket}"
+        else:
+            self.public_base = f"https://{self.bucket}.s3.{settings.s3_region}.amazonaws.com"
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+        # LRU of keys this process has seen stored, so repeated lookups don't HEAD the bucket.
+        self._known: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str):
+        with self._lock:
+            self._known[key] = None
+            self._known.move_to_end(key)
+            while len(self._known) > KNOWN_KEYS:
+                self._known.popitem(last=False)
+
+    def _forget(self, keys: list[str]):
+        with self._lock:
+            for key in keys:
+                self._known.pop(key, None)
+
+    def put(self, source: Path, key: str):
+        content_type = guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_file(str(source), self.bucket, key, ExtraArgs={"ContentType": content_type})
+        source.unlink(missing_ok=True)
+        self._remember(key)
+
+    def size(self, key: str) -> int | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            size = self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError:
+            self._forget([key])
+            return None
+        self._remember(key)
+        return size
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            if key in self._known:
+                self._known.move_to_end(key)
+                return True
+        return self.size(key) is not None
+
+    def delete(self, key: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        keys = [key]
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{key}."):
+            keys += [item["Key"] for item in page.get("Contents", ())]
+        self.remove(keys)
+
+    def remove(self, keys: list[str]):
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+        self._forget(keys)
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for item in page.get("Contents", ()):
+                key = item["Key"]
+                if any(part.startswith(".") for part in key.split("/")):
+                    continue
+                yield StoredObject(key, item["Size"], item["LastModified"].timestamp())
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        workdir = Path(tempfile.mkdtemp(prefix="visus-s3-"))
+        path = workdir / Path(key).name
+        try:
+            self.client.download_file(self.bucket, key, str(path))
+            yield path
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def publish_siblings(self, path: Path, key: str):
+        for sibling in path.parent.glob(f"{glob.escape(path.name)}.*"):
+            self.put(sibling, f"{key}{sibling.name[len(path.name):]}")
+
+    def presign_upload(self, key: str, max_bytes: int, content_type: str | None) -> dict:
+        fields = {}
+        conditions: list = [["content-length-range", 0, max_bytes]]
+        if content_type:
+            fields["Content-Type"] = content_type
+            conditions.append({"Content-Type": content_type})
+        post = self.client.generate_presigned_post(
+            self.bucket, key, Fields=fields, Conditions=conditions, ExpiresIn=settings.s3_presign_expires
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"], "key": key}
+
+
+def create_backend(root: Path) -> StorageBackend:
+    if settings.storage_mode == "s3":
+        return S3Backend()
+    if settings.storage_mode != "local":
+        raise RuntimeError(f"Unknown STORAGE_MODE {settings.storage_mode!r}")
+    return LocalBackend(root, settings.local_public_url)
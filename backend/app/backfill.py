@@ -0,0 +1,97 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import select, update
+
+from .cache import mark_changed
+from .config import get_settings
+from .database import Base, SessionLocal, add_missing_columns, engine
+from .images import METADATA_FIELDS, has_variants, is_image, process_stored, record_metadata, shutdown_pool
+from .models import Doctor, MediaAsset, Review
+from .storage import relative_path
+
+settings = get_settings()
+logger = logging.getLogger("visus.backfill")
+
+# (model, image URL column, cache section of a row)
+IMAGE_COLUMNS = (
+    (Doctor, Doctor.photo_url, lambda row: "doctors"),
+    (MediaAsset, MediaAsset.photo_url, lambda row: f"media:{row.category}"),
+    (Review, Review.poster_url, lambda row: "reviews"),
+)
+COMMIT_EVERY = 100
+
+
+def pending_images(force: bool) -> dict[str, list]:
+    """Storage key -> [(model, id, section)] for every row whose image still lacks metadata."""
+    targets: dict[str, list] = {}
+    with SessionLocal() as db:
+        for model, column, section in IMAGE_COLUMNS:
+            query = select(model).where(column.is_not(None))
+            if not force:
+                query = query.where(model.image_width.is_(None))
+            for row in db.scalars(query):
+                url = getattr(row, column.key)
+                key = relative_path(url) if is_image(url) else None
+                if key:
+                    targets.setdefault(key, []).append((model, row.id, section(row)))
+    return targets
+
+
+def describe_key(key: str) -> dict:
+    _, metadata = process_stored(key, with_variants=not has_variants(key))
+    record_metadata(key, metadata)
+    return metadata
+
+
+def backfill(force: bool = False, workers: int | None = None) -> dict:
+    """Compute metadata (and any missing variants) for already attached images, decoding in the image worker pool."""
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    for model, _, _ in IMAGE_COLUMNS:
+        add_missing_columns(engine, model.__table__)
+    targets = pending_images(force)
+    stats = {"images": len(targets), "rows": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers or settings.image_workers) as threads, SessionLocal() as db:
+        futures = {threads.submit(describe_key, key): key for key in targets}
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                metadata = future.result()
+            except Exception:
+                logger.exception("Failed to describe %s", key)
+                stats["failed"] += 1
+                continue
+            values = {f"image_{field}": metadata[field] for field in METADATA_FIELDS}
+            for model, row_id, section in targets[key]:
+                db.execute(update(model).where(model.id == row_id).values(**values))
+                mark_changed(db, section)
+                stats["rows"] += 1
+            if done % COMMIT_EVERY == 0:
+                db.commit()
+        db.commit()
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.backfill", description="Compute image metadata for existing doctors, media and reviews.")
+    parser.add_argument("--force", action="store_true", help="Recompute rows that already have metadata")
+    parser.add_argument("--workers", type=int, help=f"Images processed concurrently (default IMAGE_WORKERS={settings.image_workers})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = backfill(args.force, args.workers)
+    finally:
+        shutdown_pool()
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
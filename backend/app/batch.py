@@ -0,0 +1,82 @@
+from typing import NamedTuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import search, storage
+from .cache import mark_changed
+from .images import image_columns, metadata_by_url
+
+
+class BatchTarget(NamedTuple):
+    model: type
+    # Columns holding storage references that are retained/released as rows change.
+    url_fields: tuple[str, ...]
+    # Column whose image metadata is copied onto the row.
+    image_field: str
+    # Whether deleting a row also deletes untracked (non-deduplicated) files it pointed at.
+    delete_untracked: bool = True
+
+
+def load_rows(db: Session, target: BatchTarget, ids: list[int], scope: dict) -> list:
+    model = target.model
+    rows = db.scalars(select(model).where(model.id.in_(ids), *(getattr(model, k) == v for k, v in scope.items()))).all()
+    missing = set(ids) - {row.id for row in rows}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown ids: {sorted(missing)}")
+    return rows
+
+
+def apply_batch(db: Session, target: BatchTarget, batch, scope: dict, section: str):
+    """Apply deletes, updates, bulk creates and a reorder from ``batch`` and commit them together.
+
+    ``scope`` pins column values (e.g. the media category) for every row touched or created.
+    Nothing is written unless every referenced id exists within the scope.
+    """
+    model = target.model
+    updates = {item.id: item for item in batch.update}
+    if updates.keys() & set(batch.delete):
+        raise HTTPException(status_code=400, detail="An id cannot be both updated and deleted")
+    metadata = metadata_by_url(
+        db, [getattr(item, target.image_field) for item in (*batch.create, *batch.update)]
+    )
+
+    if batch.delete:
+        # Files a deleted row hands over to another row in this batch must survive it.
+        reused = {getattr(item, field) for item in (*batch.create, *batch.update) for field in target.url_fields}
+        for row in load_rows(db, target, batch.delete, scope):
+            for field in target.url_fields:
+                url = getattr(row, field)
+                storage.release(db, url, delete_untracked=target.delete_untracked and url not in reused)
+        db.execute(delete(model).where(model.id.in_(batch.delete)))
+        search.touch(db, model, batch.delete)
+
+    if updates:
+        for row in load_rows(db, target, list(updates), scope):
+            values = {**updates[row.id].model_dump(exclude={"id"}), **scope}
+            for field in target.url_fields:
+                storage.swap(db, getattr(row, field), values.get(field))
+            values.update(image_columns(metadata.get(values[target.image_field])))
+            for field, value in values.items():
+                setattr(row, field, value)
+        search.touch(db, model, updates)
+
+    if batch.create:
+        rows = []
+        for item in batch.create:
+            values = {**item.model_dump(), **scope}
+            for field in target.url_fields:
+                storage.retain(db, values.get(field))
+            rows.append({**values, **image_columns(metadata.get(values[target.image_field]))})
+        # A list of parameter sets runs as one executemany / multi-row INSERT; RETURNING hands back the new ids.
+        search.touch(db, model, db.scalars(insert(model).returning(model.id), rows).all())
+
+    if batch.order is not None:
+        if len(set(batch.order)) != len(batch.order):
+            raise HTTPException(status_code=400, detail="Duplicate ids in order")
+        load_rows(db, target, batch.order, scope)
+        db.execute(update(model), [{"id": row_id, "position": position} for position, row_id in enumerate(batch.order)])
+
+    mark_changed(db, section)
+    db.commit()
@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .compression import compress
+from .config import get_settings
+from .database import SessionLocal
+from .models import ContentGeneration
+
+settings = get_settings()
+logger = logging.getLogger("visus.cache")
+
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class ResponseCache:
+    """LRU of serialized response bodies, each tagged with the content sections it was built from."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires, body, sections, body per content-encoding)
+        self._entries: OrderedDict[str, tuple[float, bytes, frozenset[str], dict[str, bytes]]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, body: bytes, sections: Iterable[str], generation: int | None = None):
+        with self._lock:
+            # Skip bodies built from data that was invalidated while they were being built.
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, body, frozenset(sections), {})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key: str, sections: Iterable[str], build: Callable[[], bytes]) -> bytes:
+        body = self.get(key)
+        if body is None:
+            generation = self._generation
+            body = build()
+            self.set(key, body, sections, generation)
+        return body
+
+    async def aget_or_build(self, key: str, sections: Iterable[str], build: Callable[[], Awaitable[bytes]]) -> bytes:
+        body = self.get(key)
+        if body is None:
+            generation = self._generation
+            body = await build()
+            self.set(key, body, sections, generation)
+        return body
+
+    async def aencoded(self, key: str, body: bytes, encoding: str) -> bytes:
+        """``body`` compressed with ``encoding``, done once per cached entry and reused until it is dropped."""
+        with self._lock:
+            entry = self._entries.get(key)
+            stored = entry is not None and entry[1] is body
+            cached = entry[3].get(encoding) if stored else None
+        if cached is not None:
+            return cached
+        if not stored:
+            # Not cached (disabled, evicted or built from stale data): used once, so the cheap levels do.
+            return compress(body, encoding)
+        # Best-ratio compression of a large body takes long enough to stall the event loop.
+        compressed = await run_in_threadpool(compress, body, encoding, True)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is body:
+                entry[3][encoding] = compressed
+        return compressed
+
+    def invalidate(self, *sections: str):
+        changed = set(sections)
+        with self._lock:
+            self._generation += 1
+            for key in [key for key, entry in self._entries.items() if entry[2] & changed]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class ContentVersions:
+    """Per-section generations and modification times, mirrored from the shared content_generations table.
+
+    The counters live in the database, so every worker and container derives the same
+    ETags and they survive restarts.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._versions: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, section: str) -> tuple[int, float]:
+        with self._lock:
+            return self._versions.get(section, (0, self.started))
+
+    def changed(self, rows: Iterable[tuple[str, int, float]]) -> set[str]:
+        """The sections ``rows`` would move forward, without recording them."""
+        with self._lock:
+            return {
+                section for section, generation, _ in rows
+                if section not in self._versions or generation > self._versions[section][0]
+            }
+
+    def apply(self, rows: Iterable[tuple[str, int, float]]) -> set[str]:
+        """Record (section, generation, modified) rows; returns the sections whose generation moved forward."""
+        changed = set()
+        with self._lock:
+            for section, generation, modified in rows:
+                if section not in self._versions or generation > self._versions[section][0]:
+                    self._versions[section] = (generation, modified)
+                    changed.add(section)
+        return changed
+
+    def validators(self, sections: Iterable[str]) -> tuple[str, float]:
+        """Strong ETag and last modification time for a response built from the given sections."""
+        stamps = [(section, *self.get(section)) for section in sorted(sections)]
+        tag = ".".join(f"{section}-{version}" for section, version, _ in stamps)
+        return f'"{tag}"', max(modified for _, _, modified in stamps)
+
+
+class GenerationWatcher:
+    """Polls content_generations so writes committed by other workers, containers or CLI jobs
+    drop this worker's cached bodies and reach its change listeners within one interval.
+    Each poll is a single read of a table with one row per section.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> set[str]:
+        with SessionLocal() as db:
+            rows = db.execute(select(ContentGeneration.section, ContentGeneration.generation, ContentGeneration.modified)).all()
+        changed = content_versions.changed(rows)
+        if changed:
+            # Bodies go first, so no request pairs the new validators with an old cached body.
+            response_cache.invalidate(*changed)
+            content_versions.apply(rows)
+            # Local commits are applied as they happen, so these came from another process.
+            for listener in change_listeners:
+                listener(changed)
+        return changed
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="content-generations", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Polling content generations failed")
+
+
+response_cache = ResponseCache(settings.response_cache_ttl, settings.response_cache_size)
+content_versions = ContentVersions()
+generation_watcher = GenerationWatcher(settings.content_poll_ms / 1000)
+# Called with the changed sections after every commit that touched public content, local or seen by the watcher.
+change_listeners: list[Callable[[set[str]], None]] = []
+
+
+def mark_changed(db: Session, *sections: str):
+    """Record content sections touched by this transaction; their generations are bumped as part of it."""
+    db.info.setdefault("changed_sections", set()).update(sections)
+
+
+def ensure_generations(bind: Engine, sections: Iterable[str]):
+    """Give every known section a row, so all workers report the same Last-Modified before its first change."""
+    upsert = UPSERTS[bind.dialect.name]
+    with bind.begin() as connection:
+        connection.execute(
+            upsert(ContentGeneration).values([{"section": section, "generation": 0, "modified": time.time()} for section in sections]).on_conflict_do_nothing()
+        )
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _bump_generations(session: Session):
+    sections = session.info.get("changed_sections")
+    if not sections:
+        return
+    now = time.time()
+    statement = UPSERTS[session.get_bind().dialect.name](ContentGeneration).values(
+        [{"section": section, "generation": 1, "modified": now} for section in sorted(sections)]
+    )
+    # Row locks on the bumped sections order concurrent writers, so generations never go backwards.
+    statement = statement.on_conflict_do_update(
+        index_elements=[ContentGeneration.section],
+        set_={"generation": ContentGeneration.generation + 1, "modified": statement.excluded.modified},
+    ).returning(ContentGeneration.section, ContentGeneration.generation, ContentGeneration.modified)
+    session.info["bumped_generations"] = session.execute(statement).all()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_changed(session: Session):
+    sections = session.info.pop("changed_sections", None)
+    bumped = session.info.pop("bumped_generations", ())
+    if sections:
+        # Bodies go first, so no request pairs the new validators with an old cached body.
+        response_cache.invalidate(*sections)
+        content_versions.apply(bumped)
+        for listener in change_listeners:
+            listener(sections)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_changed(session: Session):
+    session.info.pop("changed_sections", None)
+    session.info.pop("bumped_generations", None)
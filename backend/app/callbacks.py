@@ -0,0 +1,111 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator
+
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import CallbackRequest
+
+CALLBACK_STATUSES = {"NEW", "IN_PROGRESS", "DONE", "CANCELLED"}
+EXPORT_COLUMNS = ("id", "name", "phone", "status", "created_at")
+EXPORT_BATCH = 1000
+# Leading characters that make spreadsheet apps evaluate a cell as a formula.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def check_status(status: str | None):
+    if status is not None and status not in CALLBACK_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+
+
+def encode_cursor(obj: CallbackRequest) -> str:
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, obj_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(obj_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def normalize_created_at(bind: Engine):
+    """Rewrite SQLite rows stored by CURRENT_TIMESTAMP ("YYYY-MM-DD HH:MM:SS") in the "...SS.ffffff" form bound cursors use.
+
+    SQLite compares these as text, so a short value sorts before its own cursor and keyset
+    pages would keep returning it.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as connection:
+        connection.exec_driver_sql("UPDATE callback_requests SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+def filtered(query, status: str | None):
+    if status is not None:
+        query = query.where(CallbackRequest.status == status)
+    return query.order_by(CallbackRequest.created_at.desc(), CallbackRequest.id.desc())
+
+
+def list_page(db: Session, status: str | None, cursor: str | None, limit: int) -> dict:
+    """Newest-first page seeking past ``cursor`` on (created_at, id) instead of using OFFSET."""
+    check_status(status)
+    query = filtered(select(CallbackRequest), status)
+    if cursor:
+        query = query.where(tuple_(CallbackRequest.created_at, CallbackRequest.id) < decode_cursor(cursor))
+    rows = db.scalars(query.limit(limit + 1)).all()
+    items = rows[:limit]
+    return {"items": items, "next_cursor": encode_cursor(items[-1]) if len(rows) > limit else None}
+
+
+def set_status(db: Session, ids: list[int], status: str) -> int:
+    check_status(status)
+    if not ids:
+        return 0
+    updated = db.execute(update(CallbackRequest).where(CallbackRequest.id.in_(ids)).values(status=status)).rowcount
+    db.commit()
+    return updated
+
+
+def _export_batches(status: str | None) -> Iterator[list]:
+    # The request-scoped session is closed before the body streams, so the export owns its own.
+    with SessionLocal() as db:
+        query = filtered(select(*(getattr(CallbackRequest, column) for column in EXPORT_COLUMNS)), status)
+        # yield_per turns on stream_results, i.e. a server-side cursor on PostgreSQL.
+        yield from db.execute(query.execution_options(yield_per=EXPORT_BATCH)).partitions()
+
+
+def csv_cell(value):
+    """Quote visitor-submitted text that a spreadsheet would run as a formula; "'" shows "+7 701…" as typed."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def export_csv(status: str | None) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _export_batches(status):
+        writer.writerows([csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(status: str | None) -> Iterator[str]:
+    for batch in _export_batches(status):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=datetime.isoformat, ensure_ascii=False) + "\n" for row in batch
+        )
@@ -6,12 +6,54 @@ from pydantic import Field
 class Settings(BaseSettings):
     app_name: str = "VISUS API"
     database_url: str = Field("postgresql+psycopg2://visus:visus@db:5432/visus", alias="DATABASE_URL")
+    async_database_url: str | None = Field(None, alias="ASYNC_DATABASE_URL")
+    db_pool_size: int = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(1800, alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, alias="DB_POOL_PRE_PING")
     allowed_origins: str = Field("http://localhost:5173,http://localhost:4173", alias="ALLOWED_ORIGINS")
     admin_username: str = Field("admin", alias="ADMIN_USERNAME")
     admin_password: str = Field("admin", alias="ADMIN_PASSWORD")
     storage_mode: str = Field("local", alias="STORAGE_MODE")
     local_storage_path: str = Field("/app/storage", alias="LOCAL_STORAGE_PATH")
     local_public_url: str = Field("http://localhost:8080/media", alias="LOCAL_PUBLIC_URL")
+    s3_bucket: str = Field("visus-media", alias="S3_BUCKET")
+    s3_endpoint_url: str | None = Field(None, alias="S3_ENDPOINT_URL")
+    s3_region: str = Field("us-east-1", alias="S3_REGION")
+    s3_access_key: str | None = Field(None, alias="S3_ACCESS_KEY")
+    s3_secret_key: str | None = Field(None, alias="S3_SECRET_KEY")
+    s3_public_url: str | None = Field(None, alias="S3_PUBLIC_URL")
+    s3_presign_expires: int = Field(900, alias="S3_PRESIGN_EXPIRES")
+    storage_dedup: bool = Field(False, alias="STORAGE_DEDUP")
+    max_upload_bytes: int = Field(50 * 1024 * 1024, alias="MAX_UPLOAD_BYTES")
+    upload_chunk_bytes: int = Field(4 * 1024 * 1024, alias="UPLOAD_CHUNK_BYTES")
+    upload_session_ttl_hours: float = Field(24, alias="UPLOAD_SESSION_TTL_HOURS")
+    image_workers: int = Field(2, alias="IMAGE_WORKERS")
+    media_max_age: int = Field(3600, alias="MEDIA_MAX_AGE")
+    media_gc_grace_hours: float = Field(24, alias="MEDIA_GC_GRACE_HOURS")
+    media_gc_interval: int = Field(0, alias="MEDIA_GC_INTERVAL")
+    callback_write_behind: bool = Field(False, alias="CALLBACK_WRITE_BEHIND")
+    callback_flush_ms: int = Field(50, alias="CALLBACK_FLUSH_MS")
+    callback_batch_size: int = Field(200, alias="CALLBACK_BATCH_SIZE")
+    callback_max_backlog: int = Field(10000, alias="CALLBACK_MAX_BACKLOG")
+    callback_ip_per_minute: float = Field(6, alias="CALLBACK_IP_PER_MINUTE")
+    callback_ip_burst: int = Field(10, alias="CALLBACK_IP_BURST")
+    callback_phone_per_hour: float = Field(4, alias="CALLBACK_PHONE_PER_HOUR")
+    callback_phone_burst: int = Field(3, alias="CALLBACK_PHONE_BURST")
+    callback_max_concurrency: int = Field(16, alias="CALLBACK_MAX_CONCURRENCY")
+    rate_limit_max_keys: int = Field(10000, alias="RATE_LIMIT_MAX_KEYS")
+    trusted_proxies: str = Field("127.0.0.1,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16", alias="TRUSTED_PROXIES")
+    slow_request_ms: float = Field(0, alias="SLOW_REQUEST_MS")
+    compression_min_bytes: int = Field(1024, alias="COMPRESSION_MIN_BYTES")
+    gzip_level: int = Field(6, alias="GZIP_LEVEL")
+    brotli_quality: int = Field(4, alias="BROTLI_QUALITY")
+    response_cache_ttl: float = Field(300, alias="RESPONSE_CACHE_TTL")
+    response_cache_size: int = Field(256, alias="RESPONSE_CACHE_SIZE")
+    content_poll_ms: int = Field(250, alias="CONTENT_POLL_MS")
+    publish_path: str | None = Field(None, alias="PUBLISH_PATH")
+    publish_delay_ms: int = Field(500, alias="PUBLISH_DELAY_MS")
+    publish_keep: int = Field(3, alias="PUBLISH_KEEP")
 
     class Config:
         env_file = ".env"
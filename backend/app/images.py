@@ -0,0 +1,169 @@
+import base64
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import SessionLocal
+from .models import ImageMetadata
+from .storage import BLOB_PREFIX, backend, relative_path
+
+settings = get_settings()
+logger = logging.getLogger("visus.images")
+
+# Longest edge in pixels for every responsive derivative.
+VARIANTS = {"thumb": 320, "card": 800, "full": 1600}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+# Longest edge of the inline blur placeholder; the browser upscales it behind the real image.
+PLACEHOLDER_EDGE = 16
+METADATA_FIELDS = ("width", "height", "bytes", "color", "placeholder")
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def is_image(name: str | None) -> bool:
+    return bool(name) and Path(name).suffix.lower() in IMAGE_SUFFIXES
+
+
+def variant_name(name: str, variant: str, fmt: str) -> str:
+    return f"{name}.{variant}.{fmt}"
+
+
+def describe(image: Image.Image, source: Path) -> dict:
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE), Image.BOX)
+    red, green, blue = small.convert("RGB").resize((1, 1), Image.BOX).getpixel((0, 0))
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return {
+        "width": image.width,
+        "height": image.height,
+        "bytes": source.stat().st_size,
+        "color": f"#{red:02x}{green:02x}{blue:02x}",
+        "placeholder": f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}",
+    }
+
+
+def build_variants(source: str, with_variants: bool = True) -> tuple[list[str], dict]:
+    """Encode every variant next to ``source`` and describe it; runs inside a worker process."""
+    src = Path(source)
+    built = []
+    with Image.open(src) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        metadata = describe(image, src)
+        if not with_variants:
+            return built, metadata
+        if src.suffix.lower() != ".webp":
+            # Full-size sibling that MediaFiles serves in place of the original to clients accepting WebP.
+            pil_format, options = FORMATS["webp"]
+            image.save(src.with_name(f"{src.name}.webp"), pil_format, **options)
+        for variant, edge in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                resized.save(src.with_name(variant_name(src.name, variant, fmt)), pil_format, **options)
+            built.append(variant)
+    return built, metadata
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.image_workers)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _variant_map(url: str, variants) -> dict[str, dict[str, str]]:
+    return {variant: {fmt: variant_name(url, variant, fmt) for fmt in FORMATS} for variant in variants}
+
+
+def has_variants(rel_path: str) -> bool:
+    return backend.exists(variant_name(rel_path, "thumb", "webp"))
+
+
+def process_stored(rel_path: str, with_variants: bool) -> tuple[list[str], dict]:
+    """Blocking: build variants and metadata for a stored object in the worker pool and publish the results."""
+    with backend.local_copy(rel_path) as path:
+        built, metadata = get_pool().submit(build_variants, str(path), with_variants).result()
+        backend.publish_siblings(path, rel_path)
+    return built, metadata
+
+
+def record_metadata(rel_path: str, metadata: dict):
+    with SessionLocal() as db:
+        db.merge(ImageMetadata(path=rel_path, **metadata))
+        db.commit()
+
+
+def lookup_metadata(db: Session, url: str | None) -> dict | None:
+    return metadata_by_url(db, [url]).get(url)
+
+
+def metadata_by_url(db: Session, urls) -> dict[str, dict]:
+    """Stored metadata for each known image URL, fetched with one query."""
+    keys = {url: relative_path(url) for url in set(urls) if is_image(url)}
+    keys = {url: key for url, key in keys.items() if key}
+    if not keys:
+        return {}
+    rows = {row.path: row for row in db.scalars(select(ImageMetadata).where(ImageMetadata.path.in_(set(keys.values()))))}
+    return {url: {field: getattr(rows[key], field) for field in METADATA_FIELDS} for url, key in keys.items() if key in rows}
+
+
+def image_columns(metadata: dict | None) -> dict:
+    metadata = metadata or {}
+    return {f"image_{field}": metadata.get(field) for field in METADATA_FIELDS}
+
+
+def attach_metadata(db: Session, obj, url: str | None):
+    """Copy the stored metadata of ``url`` onto ``obj``'s image_* columns (cleared when unknown)."""
+    for name, value in image_columns(lookup_metadata(db, url)).items():
+        setattr(obj, name, value)
+
+
+def is_described(rel_path: str) -> bool:
+    with SessionLocal() as db:
+        return db.get(ImageMetadata, rel_path) is not None
+
+
+async def generate_variants(rel_path: str, url: str) -> dict[str, dict[str, str]]:
+    if not is_image(rel_path):
+        return {}
+    # Deduplicated blobs already carry their variants (and metadata) from the first upload.
+    with_variants = not (rel_path.startswith(BLOB_PREFIX) and await run_in_threadpool(has_variants, rel_path))
+    if not with_variants and await run_in_threadpool(is_described, rel_path):
+        return _variant_map(url, VARIANTS)
+    try:
+        # The whole copy-and-render step runs off the event loop: on S3, local_copy downloads the object.
+        built, metadata = await run_in_threadpool(process_stored, rel_path, with_variants)
+        await run_in_threadpool(record_metadata, rel_path, metadata)
+    except Exception:
+        logger.exception("Failed to build image variants for %s", rel_path)
+        return {}
+    return _variant_map(url, built if with_variants else VARIANTS)
+
+
+def variant_urls(photo_url: str | None, described: bool = False) -> dict[str, dict[str, str]]:
+    # Metadata is only recorded once the variants exist. Rows without it (not backfilled yet) get no
+    # variants instead of a blocking storage lookup per row while a response is serialized.
+    if not described or not is_image(photo_url):
+        return {}
+    return _variant_map(photo_url, VARIANTS)
@@ -0,0 +1,214 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from .config import get_settings
+from .database import SessionLocal
+from .metrics import callback_rejected
+from .models import CallbackRequest
+from .storage import BASE_PATH
+
+settings = get_settings()
+logger = logging.getLogger("visus.ingest")
+
+JOURNAL_PATH = BASE_PATH / ".callbacks"
+RETRY_DELAY = 1.0
+# Seconds a client turned away by a full or stopped queue is asked to wait.
+RETRY_AFTER = 5
+
+
+class CallbackQueue:
+    """Write-behind buffer for callback requests, flushed to the database in multi-row inserts.
+
+    Every accepted row is appended and fsync'ed to a journal segment owned (and
+    flock'ed) by this process before it is acknowledged. A flush swaps in a fresh segment, inserts the
+    batch, and only then deletes the old segment, so rows survive a crash and are
+    replayed on the next start. Replay is at-least-once. While the database is down
+    at most ``max_backlog`` rows wait; further submissions are turned away with a 503.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int, max_backlog: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_backlog = max_backlog
+        self._pending: list[dict] = []
+        self._in_flight = 0
+        self._segment: Path | None = None
+        self._journal: IO[str] | None = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.flushed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        JOURNAL_PATH.mkdir(parents=True, exist_ok=True)
+        replay_journals()
+        with self._lock:
+            self._open_segment()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="callback-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, name: str, phone: str):
+        row = {"name": name, "phone": phone, "status": "NEW", "created_at": datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            if self._journal is None:
+                callback_rejected.inc("stopped")
+                raise HTTPException(status_code=503, detail="Callback queue is not running", headers={"Retry-After": str(RETRY_AFTER)})
+            if len(self._pending) + self._in_flight >= self.max_backlog:
+                callback_rejected.inc("backlog")
+                raise HTTPException(status_code=503, detail="Callback backlog is full", headers={"Retry-After": str(RETRY_AFTER)})
+            self._journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth, in_flight = len(self._pending), self._in_flight
+        return {
+            "depth": depth,
+            "in_flight": in_flight,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+    def _open_segment(self):
+        # Locked under a name replay does not match before it appears, so no replay can claim it.
+        segment = JOURNAL_PATH / f"{os.getpid()}-{uuid.uuid4().hex}.ndjson"
+        staging = segment.with_suffix(".tmp")
+        journal = staging.open("a", encoding="utf-8")
+        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(staging, segment)
+        self._segment, self._journal = segment, journal
+
+    def _take_batch(self) -> tuple[list[dict], IO[str], Path]:
+        batch, journal, segment = self._pending, self._journal, self._segment
+        self._pending = []
+        self._in_flight = len(batch)
+        if self._stopping:
+            self._journal = self._segment = None
+        else:
+            self._open_segment()
+        return batch, journal, segment
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+                if not self._pending and not stopping:
+                    continue
+                batch, journal, segment = self._take_batch()
+            if not batch or self._flush(batch):
+                segment.unlink(missing_ok=True)
+            journal.close()
+            with self._lock:
+                self._in_flight = 0
+            if stopping:
+                return
+
+    def _flush(self, batch: list[dict]) -> bool:
+        """Insert ``batch``, retrying until it lands; False when stopped first (the segment is kept for replay)."""
+        while True:
+            started = time.perf_counter()
+            try:
+                insert_rows(batch)
+            except Exception:
+                logger.exception("Failed to flush %s callback requests; retrying", len(batch))
+                with self._lock:
+                    if self._stopping:
+                        logger.warning("Stopping with %s callback requests left in %s for replay", len(batch), JOURNAL_PATH)
+                        return False
+                    self._wakeup.wait(RETRY_DELAY)
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            self.flushed += len(batch)
+            self.flushes += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+            return True
+
+
+def insert_rows(batch: list[dict]):
+    rows = [{**row, "created_at": datetime.fromisoformat(row["created_at"])} for row in batch]
+    with SessionLocal() as db:
+        # A list of parameter sets compiles to multi-row INSERT ... VALUES statements.
+        db.execute(insert(CallbackRequest), rows)
+        db.commit()
+
+
+def read_journal(journal: IO[str]) -> list[dict]:
+    rows = []
+    for line in journal:
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            # A torn final line from a crash mid-write was never acknowledged.
+            continue
+    return rows
+
+
+def replay_journals():
+    """Insert rows left in journal segments whose owning process is gone."""
+    for segment in sorted(JOURNAL_PATH.glob("*.ndjson")):
+        try:
+            journal = segment.open("r+", encoding="utf-8")
+        except FileNotFoundError:
+            # Replayed and removed by another worker since the listing.
+            continue
+        with journal:
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still held by a live worker.
+                continue
+            if not _still_linked(journal, segment):
+                # Another worker replayed it between our open and lock.
+                continue
+            rows = read_journal(journal)
+            if rows:
+                logger.info("Replaying %s journaled callback requests from %s", len(rows), segment.name)
+                insert_rows(rows)
+            # Removed while still locked, so no other worker can lock and replay it again.
+            segment.unlink(missing_ok=True)
+
+
+def _still_linked(journal: IO[str], segment: Path) -> bool:
+    try:
+        return os.fstat(journal.fileno()).st_ino == segment.stat().st_ino
+    except FileNotFoundError:
+        return False
+
+
+callback_queue = CallbackQueue(settings.callback_flush_ms / 1000, settings.callback_batch_size, settings.callback_max_backlog)
@@ -1,15 +1,35 @@
+import asyncio
 import logging
+from pathlib import Path, PurePosixPath
+from functools import lru_cache
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from typing import List
-from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .config import get_settings
-from .database import Base, engine, get_db, SessionLocal
-from . import models, schemas
+from .database import Base, add_missing_columns, async_engine, engine, get_async_db, get_db, SessionLocal
+from . import callbacks, metrics, models, schemas, search, transfer, uploads
+from .batch import BatchTarget, apply_batch
+from .compression import ENCODINGS, CompressionMiddleware, negotiate
 from .auth import get_admin
-from .storage import save_file, delete_file
+from .cache import change_listeners, content_versions, ensure_generations, generation_watcher, mark_changed, response_cache
+from . import storage
+from .storage import StoredFile, UploadTooLarge, check_size, save_upload, delete_file
+from .images import attach_metadata, generate_variants, shutdown_pool
+from .ingest import callback_queue
+from .media import MediaFiles
+from .ratelimit import callback_limiter
+from .reconcile import reconcile_task
+from .snapshot import SnapshotPublisher
 
 settings = get_settings()
 
@@ -17,10 +37,20 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("visus")
 
 VALID_MEDIA_CATEGORIES = {"diagnostics", "interior"}
+PUBLIC_SECTIONS = ("doctors", "services", "reviews", *(f"media:{category}" for category in sorted(VALID_MEDIA_CATEGORIES)))
+UPLOAD_BATCH_LIMIT = 50
+UPLOAD_BATCH_CONCURRENCY = 4
+
+DOCTOR_BATCH = BatchTarget(models.Doctor, ("photo_url",), "photo_url")
+REVIEW_BATCH = BatchTarget(models.Review, ("poster_url", "video_url"), "poster_url", delete_untracked=False)
+MEDIA_BATCH = BatchTarget(models.MediaAsset, ("photo_url",), "photo_url")
 
 
 app = FastAPI(title=settings.app_name)
 
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[origin.strip() for origin in settings.allowed_origins.split(',')],
@@ -28,67 +58,276 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(uploads.UploadLimitMiddleware, paths={"/api/admin/upload": 1, "/api/admin/upload/batch": UPLOAD_BATCH_LIMIT})
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.mount("/media", MediaFiles(directory=settings.local_storage_path), name="media")
 
-app.mount("/media", StaticFiles(directory=settings.local_storage_path), name="media")
+
+@app.exception_handler(UploadTooLarge)
+def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
 
 
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so indexes added later are created here.
+    for index in models.CallbackRequest.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    callbacks.normalize_created_at(engine)
+    for model in (models.Doctor, models.Review, models.MediaAsset, models.StoredBlob):
+        add_missing_columns(engine, model.__table__)
+    search.ensure_index(engine)
+    ensure_generations(engine, PUBLIC_SECTIONS)
+    generation_watcher.refresh()
+    if settings.content_poll_ms > 0:
+        generation_watcher.start()
+    if settings.callback_write_behind:
+        callback_queue.start()
+    if settings.media_gc_interval > 0:
+        reconcile_task.start()
+    if publisher is not None:
+        publisher.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if settings.content_poll_ms > 0:
+        generation_watcher.stop()
+    if settings.callback_write_behind:
+        callback_queue.stop()
+    if settings.media_gc_interval > 0:
+        reconcile_task.stop()
+    if publisher is not None:
+        publisher.stop()
+    shutdown_pool()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+
+def display_order(model) -> tuple:
+    return model.position.asc().nulls_last(), model.id
+
+
+def doctors_query(*entities):
+    return select(*entities or [models.Doctor]).order_by(*display_order(models.Doctor))
+
+
+def active_services_query(*entities):
+    return select(*entities or [models.ServiceItem]).where(models.ServiceItem.is_active.is_(True)).order_by(models.ServiceItem.id)
+
+
+def reviews_query(*entities):
+    return select(*entities or [models.Review]).order_by(*display_order(models.Review))
+
+
+def media_query(category: str, *entities):
+    if category not in VALID_MEDIA_CATEGORIES:
+        raise HTTPException(status_code=400, detail="Unknown category")
+    return select(*entities or [models.MediaAsset]).where(models.MediaAsset.category == category).order_by(*display_order(models.MediaAsset))
+
+
+def read_columns(model, schema) -> list:
+    """Just the columns behind ``schema``'s fields, selected as Core rows instead of hydrated ORM objects."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+@lru_cache
+def list_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+async def fetch_rows(db: AsyncSession, schema, query) -> list:
+    return list_adapter(schema).validate_python((await db.execute(query)).all(), from_attributes=True)
+
+
+def list_builder(db: AsyncSession, schema, query):
+    async def build() -> bytes:
+        # One validation pass and a Rust-side JSON dump, instead of model_validate + jsonable_encoder + json.dumps.
+        return list_adapter(schema).dump_json(await fetch_rows(db, schema, query), by_alias=True)
+
+    return build
+
+
+async def render_site(db: AsyncSession, lang: str) -> bytes:
+    async def section(schema, query):
+        return [obj.localized(lang) for obj in await fetch_rows(db, schema, query)]
+
+    return to_json({
+        "doctors": await section(schemas.DoctorRead, doctors_query(*read_columns(models.Doctor, schemas.DoctorRead))),
+        "services": await section(schemas.ServiceRead, active_services_query(*read_columns(models.ServiceItem, schemas.ServiceRead))),
+        "reviews": await section(schemas.ReviewRead, reviews_query(*read_columns(models.Review, schemas.ReviewRead))),
+        "media": {
+            category: await section(schemas.MediaAssetRead, media_query(category, *read_columns(models.MediaAsset, schemas.MediaAssetRead)))
+            for category in sorted(VALID_MEDIA_CATEGORIES)
+        },
+    })
+
+
+def render_snapshot(db: Session) -> dict[str, bytes]:
+    """The public list payloads, byte-identical to their live endpoints, keyed by URL path."""
+    lists = {
+        "api/doctors": (schemas.DoctorRead, doctors_query(*read_columns(models.Doctor, schemas.DoctorRead))),
+        "api/services": (schemas.ServiceRead, active_services_query(*read_columns(models.ServiceItem, schemas.ServiceRead))),
+        "api/reviews": (schemas.ReviewRead, reviews_query(*read_columns(models.Review, schemas.ReviewRead))),
+        **{
+            f"api/media/{category}": (schemas.MediaAssetRead, media_query(category, *read_columns(models.MediaAsset, schemas.MediaAssetRead)))
+            for category in sorted(VALID_MEDIA_CATEGORIES)
+        },
+    }
+    documents = {}
+    for path, (schema, query) in lists.items():
+        adapter = list_adapter(schema)
+        documents[path] = adapter.dump_json(adapter.validate_python(db.execute(query).all(), from_attributes=True), by_alias=True)
+    return documents
+
+
+publisher = None
+if settings.publish_path:
+    publisher = SnapshotPublisher(Path(settings.publish_path), render_snapshot, settings.publish_delay_ms / 1000, settings.publish_keep)
+    change_listeners.append(publisher.request)
+
+
+def strip_encoding(tag: str) -> str:
+    """Map a per-encoding ETag back to the content version it was derived from."""
+    for encoding in ENCODINGS:
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [strip_encoding(tag.strip()) for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def held_etag(request: Request, etag: str) -> str:
+    """The If-None-Match tag (possibly per-encoding) that matched ``etag``, so a 304 names the cached representation."""
+    for tag in request.headers.get("if-none-match", "").split(","):
+        if strip_encoding(tag.strip()) == etag:
+            return tag.strip()
+    return etag
+
+
+async def cached_json(request: Request, key: str, sections: tuple[str, ...], build) -> Response:
+    etag, last_modified = content_versions.validators(sections)
+    headers = {"ETag": etag, "Last-Modified": formatdate(last_modified, usegmt=True), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if not_modified(request, etag, last_modified):
+        headers["ETag"] = held_etag(request, etag)
+        return Response(status_code=304, headers=headers)
+    body = await response_cache.aget_or_build(key, sections, build)
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is not None and len(body) >= settings.compression_min_bytes:
+        body = await response_cache.aencoded(key, body, encoding)
+        # Each encoding is its own representation, so it gets its own strong ETag.
+        headers.update({"Content-Encoding": encoding, "ETag": f'{etag[:-1]}-{encoding}"'})
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/doctors", response_model=List[schemas.DoctorRead])
-def list_doctors(db: Session = Depends(get_db)):
+async def list_doctors(request: Request, db: AsyncSession = Depends(get_async_db)):
     logger.debug("GET /api/doctors")
-    return db.query(models.Doctor).order_by(models.Doctor.id).all()
+    return await cached_json(request, "doctors", ("doctors",), list_builder(db, schemas.DoctorRead, doctors_query(*read_columns(models.Doctor, schemas.DoctorRead))))
 
 
 @app.get("/api/services", response_model=List[schemas.ServiceRead])
-def list_services(db: Session = Depends(get_db)):
+async def list_services(request: Request, db: AsyncSession = Depends(get_async_db)):
     logger.debug("GET /api/services")
-    return db.query(models.ServiceItem).filter(models.ServiceItem.is_active.is_(True)).order_by(models.ServiceItem.id).all()
+    return await cached_json(request, "services", ("services",), list_builder(db, schemas.ServiceRead, active_services_query(*read_columns(models.ServiceItem, schemas.ServiceRead))))
 
 
 @app.get("/api/reviews", response_model=List[schemas.ReviewRead])
-def list_reviews(db: Session = Depends(get_db)):
+async def list_reviews(request: Request, db: AsyncSession = Depends(get_async_db)):
     logger.debug("GET /api/reviews")
-    return db.query(models.Review).order_by(models.Review.id).all()
+    return await cached_json(request, "reviews", ("reviews",), list_builder(db, schemas.ReviewRead, reviews_query(*read_columns(models.Review, schemas.ReviewRead))))
 
 
-@app.post("/api/requests/callback", response_model=schemas.CallbackRead, status_code=201)
-def create_callback(request: schemas.CallbackCreate, db: Session = Depends(get_db)):
+@app.post("/api/requests/callback", response_model=schemas.CallbackRead, status_code=201, responses={202: {"description": "Queued for a batched insert"}, 429: {"description": "Rate limited; see Retry-After"}, 503: {"description": "Too many requests in flight"}})
+def create_callback(request: schemas.CallbackCreate, http_request: Request, db: Session = Depends(get_db)):
     logger.info("New callback request from %s", request.name)
-    obj = models.CallbackRequest(name=request.name, phone=request.phone)
-    db.add(obj)
-    db.commit()
-    db.refresh(obj)
+    callback_limiter.check(http_request, request.phone)
+    if settings.callback_write_behind:
+        callback_queue.submit(request.name, request.phone)
+        return JSONResponse(status_code=202, content={"status": "queued"})
+    with callback_limiter.backpressure.slot():
+        obj = models.CallbackRequest(name=request.name, phone=request.phone)
+        db.add(obj)
+        db.commit()
+        db.refresh(obj)
     return obj
 
 
-def get_media_assets(db: Session, category: str):
-    if category not in VALID_MEDIA_CATEGORIES:
-        raise HTTPException(status_code=400, detail="Unknown category")
-    return db.query(models.MediaAsset).filter(models.MediaAsset.category == category).order_by(models.MediaAsset.id).all()
-
-
 @app.get("/api/media/{category}", response_model=List[schemas.MediaAssetRead])
-def list_media(category: str, db: Session = Depends(get_db)):
+async def list_media(category: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     logger.debug("GET /api/media/%s", category)
-    return get_media_assets(db, category)
+    query = media_query(category, *read_columns(models.MediaAsset, schemas.MediaAssetRead))
+    section = f"media:{category}"
+    return await cached_json(request, section, (section,), list_builder(db, schemas.MediaAssetRead, query))
+
+
+@app.get("/api/site")
+async def get_site(request: Request, lang: str = Query("ru", pattern="^(ru|kk)$"), db: AsyncSession = Depends(get_async_db)):
+    """Everything the landing page renders, in one response projected to a single language."""
+    logger.debug("GET /api/site lang=%s", lang)
+    return await cached_json(request, f"site:{lang}", PUBLIC_SECTIONS, lambda: render_site(db, lang))
+
+
+@app.get("/api/search", response_model=schemas.SearchResponse)
+async def search_content(q: str = Query(..., min_length=1, max_length=200), lang: str = Query("ru", pattern="^(ru|kk)$"), limit: int = Query(20, ge=1, le=50), db: AsyncSession = Depends(get_async_db)):
+    """Ranked prefix search over active services, doctors and reviews; matches come back wrapped in <mark>."""
+    logger.debug("GET /api/search lang=%s", lang)
+    return {"query": q, "lang": lang, "results": await search.search(db, q, lang, limit)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(_: str = Depends(get_admin)):
+    queue = callback_queue.stats()
+    extra = [
+        *metrics.gauge("visus_response_cache_entries", "Serialized responses held in the cache.", len(response_cache)),
+        *metrics.gauge("visus_callback_queue_depth", "Callback requests waiting for the next flush.", queue["depth"]),
+        *metrics.gauge("visus_callback_flush_last_seconds", "Duration of the last callback flush.", queue["last_flush_ms"] / 1000),
+        *metrics.gauge("visus_rate_limit_keys", "Client addresses and phone numbers tracked by the callback limiter.", callback_limiter.tracked_keys()),
+    ]
+    if reconcile_task.last_report is not None:
+        report = reconcile_task.last_report
+        extra += [
+            *metrics.gauge("visus_media_objects", "Objects in the media store at the last reconciliation.", report["scanned"]),
+            *metrics.gauge("visus_media_orphans_deleted", "Orphaned objects removed by the last reconciliation.", report["deleted"]),
+            *metrics.gauge("visus_media_references_missing", "Referenced keys absent from the store at the last reconciliation.", report["missing"]),
+        ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
 
 
 # Admin routes
 @app.get("/api/admin/doctors", response_model=List[schemas.DoctorRead])
 def admin_list_doctors(_: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.debug("ADMIN list doctors")
-    return db.query(models.Doctor).order_by(models.Doctor.id).all()
+    return db.scalars(doctors_query()).all()
 
 
 @app.post("/api/admin/doctors", response_model=schemas.DoctorRead)
 def admin_create_doctor(data: schemas.DoctorCreate, _: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.info("ADMIN create doctor %s", data.name)
     obj = models.Doctor(**data.dict(by_alias=False))
+    attach_metadata(db, obj, obj.photo_url)
     db.add(obj)
+    storage.retain(db, obj.photo_url)
+    search.touch(db, models.Doctor, [obj])
+    mark_changed(db, "doctors")
     db.commit()
     db.refresh(obj)
     return obj
@@ -100,8 +339,12 @@ def admin_update_doctor(doctor_id: int, data: schemas.DoctorCreate, _: str = Dep
     obj = db.get(models.Doctor, doctor_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Doctor not found")
+    storage.swap(db, obj.photo_url, data.photo_url)
     for field, value in data.dict(by_alias=False).items():
         setattr(obj, field, value)
+    attach_metadata(db, obj, obj.photo_url)
+    search.touch(db, models.Doctor, [obj])
+    mark_changed(db, "doctors")
     db.commit()
     db.refresh(obj)
     return obj
@@ -113,12 +356,20 @@ def admin_delete_doctor(doctor_id: int, _: str = Depends(get_admin), db: Session
     if not obj:
         raise HTTPException(status_code=404, detail="Doctor not found")
     logger.info("ADMIN delete doctor %s", doctor_id)
-    if obj.photo_url:
-        delete_file(obj.photo_url)
+    storage.release(db, obj.photo_url)
     db.delete(obj)
+    search.touch(db, models.Doctor, [obj.id])
+    mark_changed(db, "doctors")
     db.commit()
 
 
+@app.post("/api/admin/doctors/batch", response_model=List[schemas.DoctorRead])
+def admin_batch_doctors(data: schemas.DoctorBatch, _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    logger.info("ADMIN batch doctors create=%s update=%s delete=%s", len(data.create), len(data.update), len(data.delete))
+    apply_batch(db, DOCTOR_BATCH, data, {}, "doctors")
+    return db.scalars(doctors_query()).all()
+
+
 @app.get("/api/admin/services", response_model=List[schemas.ServiceRead])
 def admin_list_services(_: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.debug("ADMIN list services")
@@ -130,6 +381,8 @@ def admin_create_service(data: schemas.ServiceCreate, _: str = Depends(get_admin
     logger.info("ADMIN create service %s", data.slug)
     obj = models.ServiceItem(**data.dict(by_alias=False))
     db.add(obj)
+    search.touch(db, models.ServiceItem, [obj])
+    mark_changed(db, "services")
     db.commit()
     db.refresh(obj)
     return obj
@@ -143,6 +396,8 @@ def admin_update_service(service_id: int, data: schemas.ServiceCreate, _: str =
         raise HTTPException(status_code=404, detail="Service not found")
     for field, value in data.dict(by_alias=False).items():
         setattr(obj, field, value)
+    search.touch(db, models.ServiceItem, [obj])
+    mark_changed(db, "services")
     db.commit()
     db.refresh(obj)
     return obj
@@ -155,20 +410,27 @@ def admin_delete_service(service_id: int, _: str = Depends(get_admin), db: Sessi
         raise HTTPException(status_code=404, detail="Service not found")
     logger.info("ADMIN delete service %s", service_id)
     db.delete(obj)
+    search.touch(db, models.ServiceItem, [obj.id])
+    mark_changed(db, "services")
     db.commit()
 
 
 @app.get("/api/admin/reviews", response_model=List[schemas.ReviewRead])
 def admin_list_reviews(_: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.debug("ADMIN list reviews")
-    return db.query(models.Review).order_by(models.Review.id).all()
+    return db.scalars(reviews_query()).all()
 
 
 @app.post("/api/admin/reviews", response_model=schemas.ReviewRead)
 def admin_create_review(data: schemas.ReviewCreate, _: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.info("ADMIN create review %s", data.patient_name)
     obj = models.Review(**data.dict(by_alias=False))
+    attach_metadata(db, obj, obj.poster_url)
     db.add(obj)
+    storage.retain(db, obj.poster_url)
+    storage.retain(db, obj.video_url)
+    search.touch(db, models.Review, [obj])
+    mark_changed(db, "reviews")
     db.commit()
     db.refresh(obj)
     return obj
@@ -180,8 +442,13 @@ def admin_update_review(review_id: int, data: schemas.ReviewCreate, _: str = Dep
     obj = db.get(models.Review, review_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Review not found")
+    storage.swap(db, obj.poster_url, data.poster_url)
+    storage.swap(db, obj.video_url, data.video_url)
     for field, value in data.dict(by_alias=False).items():
         setattr(obj, field, value)
+    attach_metadata(db, obj, obj.poster_url)
+    search.touch(db, models.Review, [obj])
+    mark_changed(db, "reviews")
     db.commit()
     db.refresh(obj)
     return obj
@@ -193,14 +460,25 @@ def admin_delete_review(review_id: int, _: str = Depends(get_admin), db: Session
     if not obj:
         raise HTTPException(status_code=404, detail="Review not found")
     logger.info("ADMIN delete review %s", review_id)
+    storage.release(db, obj.poster_url, delete_untracked=False)
+    storage.release(db, obj.video_url, delete_untracked=False)
     db.delete(obj)
+    search.touch(db, models.Review, [obj.id])
+    mark_changed(db, "reviews")
     db.commit()
 
 
+@app.post("/api/admin/reviews/batch", response_model=List[schemas.ReviewRead])
+def admin_batch_reviews(data: schemas.ReviewBatch, _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    logger.info("ADMIN batch reviews create=%s update=%s delete=%s", len(data.create), len(data.update), len(data.delete))
+    apply_batch(db, REVIEW_BATCH, data, {}, "reviews")
+    return db.scalars(reviews_query()).all()
+
+
 @app.get("/api/admin/media/{category}", response_model=List[schemas.MediaAssetRead])
 def admin_list_media(category: str, _: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.debug("ADMIN list media %s", category)
-    return get_media_assets(db, category)
+    return db.scalars(media_query(category)).all()
 
 
 @app.post("/api/admin/media/{category}", response_model=schemas.MediaAssetRead)
@@ -214,7 +492,10 @@ def admin_create_media(category: str, data: schemas.MediaAssetCreate, _: str = D
         description=data.description,
         photo_url=data.photo_url,
     )
+    attach_metadata(db, obj, obj.photo_url)
     db.add(obj)
+    storage.retain(db, obj.photo_url)
+    mark_changed(db, f"media:{category}")
     db.commit()
     db.refresh(obj)
     return obj
@@ -228,9 +509,12 @@ def admin_update_media(category: str, media_id: int, data: schemas.MediaAssetCre
     if not obj or obj.category != category:
         raise HTTPException(status_code=404, detail="Media not found")
     logger.info("ADMIN update media %s id=%s", category, media_id)
+    storage.swap(db, obj.photo_url, data.photo_url)
     obj.title = data.title
     obj.description = data.description
     obj.photo_url = data.photo_url
+    attach_metadata(db, obj, obj.photo_url)
+    mark_changed(db, f"media:{category}")
     db.commit()
     db.refresh(obj)
     return obj
@@ -244,20 +528,179 @@ def admin_delete_media(category: str, media_id: int, _: str = Depends(get_admin)
     if not obj or obj.category != category:
         raise HTTPException(status_code=404, detail="Media not found")
     logger.info("ADMIN delete media %s id=%s", category, media_id)
-    delete_file(obj.photo_url)
+    storage.release(db, obj.photo_url)
     db.delete(obj)
+    mark_changed(db, f"media:{category}")
     db.commit()
 
 
+@app.post("/api/admin/publish")
+def admin_publish(_: str = Depends(get_admin)):
+    """Render and switch in a fresh static snapshot right away."""
+    if publisher is None:
+        raise HTTPException(status_code=409, detail="Snapshot publishing needs PUBLISH_PATH")
+    logger.info("ADMIN publish snapshot")
+    return publisher.publish()
+
+
+@app.post("/api/admin/media/{category}/batch", response_model=List[schemas.MediaAssetRead])
+def admin_batch_media(category: str, data: schemas.MediaAssetBatch, _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    query = media_query(category)
+    logger.info("ADMIN batch media %s create=%s update=%s delete=%s", category, len(data.create), len(data.update), len(data.delete))
+    apply_batch(db, MEDIA_BATCH, data, {"category": category}, f"media:{category}")
+    return db.scalars(query).all()
+
+
+@app.get("/api/admin/callbacks", response_model=schemas.CallbackPage)
+def admin_list_callbacks(status: str | None = None, cursor: str | None = None, limit: int = Query(50, ge=1, le=500), _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    logger.debug("ADMIN list callbacks status=%s", status)
+    return callbacks.list_page(db, status, cursor, limit)
+
+
+@app.patch("/api/admin/callbacks/status")
+def admin_update_callback_status(data: schemas.CallbackStatusUpdate, _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    logger.info("ADMIN set status %s on %s callbacks", data.status, len(data.ids))
+    return {"updated": callbacks.set_status(db, data.ids, data.status)}
+
+
+@app.get("/api/admin/callbacks/queue")
+def admin_callback_queue_stats(_: str = Depends(get_admin)):
+    return {"enabled": settings.callback_write_behind, **callback_queue.stats()}
+
+
+@app.get("/api/admin/callbacks/export")
+def admin_export_callbacks(format: str = Query("csv", pattern="^(csv|ndjson)$"), status: str | None = None, _: str = Depends(get_admin)):
+    logger.info("ADMIN export callbacks format=%s status=%s", format, status)
+    callbacks.check_status(status)
+    if format == "ndjson":
+        return StreamingResponse(callbacks.export_ndjson(status), media_type="application/x-ndjson")
+    return StreamingResponse(
+        callbacks.export_csv(status),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="callbacks.csv"'},
+    )
+
+
+@app.get("/api/admin/export")
+def admin_export(media: bool = False, tables: str | None = None, _: str = Depends(get_admin)):
+    """Stream every content table (and with ``media=true`` the referenced files) as a tar.gz for ``/api/admin/import``."""
+    logger.info("ADMIN export media=%s tables=%s", media, tables)
+    names = [name.strip() for name in tables.split(",")] if tables else None
+    unknown = set(names or ()) - transfer.TABLES.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {sorted(unknown)}")
+    filename = f"visus-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.tar.gz"
+    return StreamingResponse(
+        transfer.stream_archive(names, media),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.post("/api/admin/import")
+async def admin_import(file: UploadFile = File(...), replace: bool = Form(False), _: str = Depends(get_admin)):
+    logger.info("ADMIN import %s replace=%s", file.filename, replace)
+    try:
+        return await run_in_threadpool(transfer.read_archive, file.file, replace)
+    except transfer.InvalidArchive as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
 @app.post("/api/admin/upload")
-def admin_upload(file: UploadFile = File(...), folder: str = Form("media"), objectName: str | None = Form(None), _: str = Depends(get_admin)):
+async def admin_upload(file: UploadFile = File(...), folder: str = Form("media"), objectName: str | None = Form(None), _: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.info("ADMIN upload file %s folder=%s", file.filename, folder)
-    url, path = save_file(file, folder, objectName or None)
-    return {"url": url, "path": path}
+    stored = await save_upload(file, folder, objectName or None, db)
+    return await upload_result(stored)
+
+
+@app.post("/api/admin/upload/batch")
+async def admin_upload_batch(files: List[UploadFile] = File(...), folder: str = Form("media"), _: str = Depends(get_admin)):
+    """Store several files concurrently; each item carries either the upload result or its error."""
+    if len(files) > UPLOAD_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {UPLOAD_BATCH_LIMIT} files per batch")
+    logger.info("ADMIN upload %s files folder=%s", len(files), folder)
+    slots = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+
+    async def store(file: UploadFile) -> dict:
+        async with slots:
+            try:
+                # Dedup registration commits, so concurrent files each get their own session.
+                with SessionLocal() as db:
+                    stored = await save_upload(file, folder, None, db)
+                return {"filename": file.filename, **await upload_result(stored)}
+            except UploadTooLarge as exc:
+                return {"filename": file.filename, "error": str(exc)}
+            except HTTPException as exc:
+                return {"filename": file.filename, "error": exc.detail}
+            except OSError:
+                logger.exception("Failed to store %s", file.filename)
+                return {"filename": file.filename, "error": "Failed to store file"}
+
+    return {"items": await asyncio.gather(*(store(file) for file in files))}
+
+
+async def upload_result(stored: StoredFile) -> dict:
+    variants = await generate_variants(stored.path, stored.url)
+    return {"url": stored.url, "path": stored.path, "sha256": stored.sha256, "size": stored.size, "variants": variants}
+
+
+@app.post("/api/admin/uploads", status_code=201)
+def admin_upload_init(data: schemas.UploadInit, _: str = Depends(get_admin)):
+    logger.info("ADMIN start chunked upload %s size=%s", data.filename, data.size)
+    return uploads.create_session(data.filename, data.size, data.folder, data.object_name or None, data.sha256)
+
+
+@app.get("/api/admin/uploads/{upload_id}")
+def admin_upload_status(upload_id: str, _: str = Depends(get_admin)):
+    return uploads.load_session(upload_id)
+
+
+@app.put("/api/admin/uploads/{upload_id}")
+async def admin_upload_chunk(upload_id: str, request: Request, offset: int = 0, _: str = Depends(get_admin)):
+    return await uploads.write_chunk(upload_id, offset, request.stream())
+
+
+@app.post("/api/admin/uploads/{upload_id}/complete")
+async def admin_upload_complete(upload_id: str, _: str = Depends(get_admin), db: Session = Depends(get_db)):
+    logger.info("ADMIN complete chunked upload %s", upload_id)
+    stored = await uploads.finalize(upload_id, db)
+    return await upload_result(stored)
+
+
+@app.delete("/api/admin/uploads/{upload_id}", status_code=204)
+def admin_upload_abort(upload_id: str, _: str = Depends(get_admin)):
+    uploads.load_session(upload_id)
+    uploads.discard(upload_id)
+
+
+@app.post("/api/admin/uploads/presign", status_code=201)
+def admin_upload_presign(data: schemas.PresignedUploadInit, _: str = Depends(get_admin)):
+    logger.info("ADMIN presign direct upload %s size=%s", data.filename, data.size)
+    check_size(data.size)
+    key = storage.object_key(data.folder, PurePosixPath(data.filename).name, None)
+    return {**storage.backend.presign_upload(key, settings.max_upload_bytes, data.content_type), "publicUrl": storage.public_url(key)}
+
+
+@app.post("/api/admin/uploads/presigned")
+async def admin_upload_presigned_complete(data: schemas.PresignedUploadComplete, _: str = Depends(get_admin)):
+    """Record an object the browser uploaded straight to the bucket."""
+    logger.info("ADMIN complete direct upload %s", data.key)
+    key = storage.relative_path(data.key)
+    if not key or key.startswith(storage.BLOB_PREFIX):
+        raise HTTPException(status_code=400, detail="Invalid key")
+    size = await run_in_threadpool(storage.backend.size, key)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Object not uploaded")
+    try:
+        check_size(size)
+    except UploadTooLarge:
+        await run_in_threadpool(storage.backend.delete, key)
+        raise
+    return await upload_result(StoredFile(storage.public_url(key), key, None, size))
 
 
 @app.delete("/api/admin/upload")
-def admin_delete_upload(objectName: str, _: str = Depends(get_admin)):
+def admin_delete_upload(objectName: str, _: str = Depends(get_admin), db: Session = Depends(get_db)):
     logger.info("ADMIN delete file %s", objectName)
-    delete_file(objectName)
+    delete_file(objectName, db)
     return {"status": "deleted"}
@@ -0,0 +1,146 @@
+import os
+import sys
+from mimetypes import guess_type
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from .config import get_settings
+from .storage import BASE_ROOT, BLOB_PREFIX
+
+settings = get_settings()
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Pre-encoded siblings are looked up as "<file>.br" / "<file>.gz", most preferred first.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+WEBP_SOURCES = {".jpg", ".jpeg", ".png"}
+
+
+def accepts(header: str | None, token: str) -> bool:
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == token and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Resolve a single "bytes=" range to inclusive offsets; multi-range requests get the whole file."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        if not last or int(last) <= 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse for a single byte range; full-file responses keep FileResponse's pathsend path."""
+
+    def __init__(self, path: PathLike, byte_range: tuple[int, int], stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start, self.end = byte_range
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        self.headers["content-range"] = f"bytes {self.start}-{self.end}/{stat_result.st_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for the upload store with byte ranges, pre-encoded siblings and per-path caching."""
+
+    def file_response(self, full_path: PathLike, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        path = Path(full_path)
+        media_type = guess_type(path.name)[0] or "application/octet-stream"
+        range_header = request_headers.get("range")
+        headers = {"Accept-Ranges": "bytes", "Vary": "Accept, Accept-Encoding", "Cache-Control": self.cache_control(path)}
+
+        if path.suffix.lower() in WEBP_SOURCES and accepts(request_headers.get("accept"), "image/webp"):
+            sibling = path.with_name(f"{path.name}.webp")
+            if sibling.is_file():
+                path, stat_result, media_type = sibling, sibling.stat(), "image/webp"
+        elif not range_header:
+            for encoding, suffix in ENCODINGS:
+                sibling = path.with_name(path.name + suffix)
+                if accepts(request_headers.get("accept-encoding"), encoding) and sibling.is_file():
+                    path, stat_result = sibling, sibling.stat()
+                    headers["Content-Encoding"] = encoding
+                    break
+
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if not range_header or request_headers.get("if-range", response.headers["etag"]) != response.headers["etag"]:
+            return response
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return response
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat_result.st_size}"})
+        return RangeFileResponse(path, byte_range, stat_result, headers=headers, media_type=media_type)
+
+    @staticmethod
+    def cache_control(path: Path) -> str:
+        # Content-addressed blobs (and their variants) never change under the same name.
+        if path.resolve().is_relative_to(BASE_ROOT / BLOB_PREFIX):
+            return IMMUTABLE_CACHE
+        return f"public, max-age={settings.media_max_age}"
+
+
+def nginx_config(root: str) -> str:
+    """`location /media/` blocks serving the store straight from disk; files must be visible at `<root>/media/`."""
+
+    def block(location: str, cache_control: str) -> str:
+        return f"""location {location} {{
+    root {root};
+    sendfile on;
+    tcp_nopush on;
+    gzip_static on;
+    add_header Cache-Control "{cache_control}";
+    add_header Vary "Accept, Accept-Encoding";
+
+    location ~* \\.(jpe?g|png)$ {{
+        set $media_webp "";
+        if ($http_accept ~* "image/webp") {{
+            set $media_webp ".webp";
+        }}
+        add_header Cache-Control "{cache_control}";
+        add_header Vary "Accept, Accept-Encoding";
+        try_files $uri$media_webp $uri =404;
+    }}
+}}
+"""
+
+    return "\n".join([
+        "# Generated by `python -m app.media`; include inside the `server` block.",
+        block("/media/", f"public, max-age={settings.media_max_age}"),
+        block(f"/media/{BLOB_PREFIX}", IMMUTABLE_CACHE),
+    ])
+
+
+if __name__ == "__main__":
+    sys.stdout.write(nginx_config(sys.argv[1] if len(sys.argv) > 1 else "/srv/visus"))
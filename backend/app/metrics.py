@@ -0,0 +1,176 @@
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("visus.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SLOW_QUERY_LIMIT = 10
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in sorted(self._values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...], labels: tuple[str, ...] = ()):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels((*self.labels, 'le'), (*key, bound))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def gauge(name: str, help: str, value: float) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+request_duration = Histogram("visus_http_request_duration_seconds", "HTTP request latency.", LATENCY_BUCKETS, ("method", "route"))
+request_total = Counter("visus_http_requests_total", "HTTP responses by status code.", ("method", "route", "status"))
+response_size = Histogram("visus_http_response_size_bytes", "HTTP response body size.", SIZE_BUCKETS, ("method", "route"))
+request_queries = Histogram("visus_db_queries_per_request", "SQL statements issued while handling one request.", QUERY_BUCKETS, ("method", "route"))
+request_db_time = Histogram("visus_db_time_per_request_seconds", "Time spent in SQL while handling one request.", LATENCY_BUCKETS, ("method", "route"))
+query_total = Counter("visus_db_queries_total", "SQL statements executed.")
+upload_duration = Histogram("visus_upload_duration_seconds", "Time to receive and store one upload.", LATENCY_BUCKETS)
+upload_bytes = Counter("visus_upload_bytes_total", "Bytes written by uploads.")
+callback_rejected = Counter("visus_callback_rejected_total", "Callback requests turned away by rate limits or backpressure.", ("reason",))
+
+REGISTRY = [request_duration, request_total, response_size, request_queries, request_db_time, query_total, upload_duration, upload_bytes, callback_rejected]
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    statements: list[tuple[float, str]] = field(default_factory=list)
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def render(extra: list[str] = ()) -> str:
+    lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join([*lines, *extra]) + "\n"
+
+
+def observe_upload(started: float, size: int):
+    upload_duration.observe(time.perf_counter() - started)
+    upload_bytes.inc(amount=size)
+
+
+def instrument_engine(engine: Engine):
+    """Attribute every statement run on ``engine`` to the request that issued it."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        query_total.inc()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+            stats.statements.append((elapsed, statement))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are counted as they are sent."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            # Route templates keep label cardinality bounded; mounts only expose their prefix.
+            route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+            method = scope["method"]
+            request_duration.observe(elapsed, method, route)
+            request_total.inc(method, route, status)
+            response_size.observe(size, method, route)
+            request_queries.observe(stats.queries, method, route)
+            request_db_time.observe(stats.db_time, method, route)
+            if settings.slow_request_ms and elapsed * 1000 >= settings.slow_request_ms:
+                log_slow_request(method, scope["path"], status, elapsed, stats)
+
+
+def log_slow_request(method: str, path: str, status: int, elapsed: float, stats: RequestStats):
+    slowest = sorted(stats.statements, reverse=True)[:SLOW_QUERY_LIMIT]
+    breakdown = "".join(f"\n  {duration * 1000:8.2f} ms  {' '.join(statement.split())[:200]}" for duration, statement in slowest)
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms; %s queries, %.1f ms in DB%s",
+        method, path, status, elapsed * 1000, stats.queries, stats.db_time * 1000, breakdown,
+    )
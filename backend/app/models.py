@@ -1,9 +1,21 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, func
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, Index, Integer, String, Boolean, Text, DateTime, Float, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
-class Doctor(Base):
+class ImageMetadataMixin:
+    """Layout hints for the row's image, copied from image_metadata whenever its URL is set."""
+
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    image_bytes = Column(BigInteger, nullable=True)
+    image_color = Column(String(7), nullable=True)
+    image_placeholder = Column(Text, nullable=True)
+
+
+class Doctor(ImageMetadataMixin, Base):
     __tablename__ = "doctors"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -13,6 +25,8 @@ class Doctor(Base):
     description_ru = Column(Text, nullable=True)
     description_kk = Column(Text, nullable=True)
     photo_url = Column(String(512), nullable=True)
+    # Display order set by batch reorders; rows without one follow in id order.
+    position = Column(Integer, nullable=True)
 
 
 class ServiceItem(Base):
@@ -29,7 +43,7 @@ class ServiceItem(Base):
     is_active = Column(Boolean, default=True)
 
 
-class Review(Base):
+class Review(ImageMetadataMixin, Base):
     __tablename__ = "reviews"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -39,6 +53,7 @@ class Review(Base):
     text_kk = Column(Text, nullable=True)
     video_url = Column(Text, nullable=True)
     poster_url = Column(String(512), nullable=True)
+    position = Column(Integer, nullable=True)
 
 
 class CallbackRequest(Base):
@@ -48,10 +63,18 @@ class CallbackRequest(Base):
     name = Column(String(150), nullable=False)
     phone = Column(String(80), nullable=False)
     status = Column(String(32), default="NEW", nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set from Python so every row is stored in the driver's format (SQLite's CURRENT_TIMESTAMP drops
+    # the fraction, which breaks keyset comparisons); the server default covers raw SQL inserts.
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Keyset pagination of the admin inbox, optionally narrowed to one status.
+        Index("ix_callback_requests_created_id", "created_at", "id"),
+        Index("ix_callback_requests_status_created_id", "status", "created_at", "id"),
+    )
 
 
-class MediaAsset(Base):
+class MediaAsset(ImageMetadataMixin, Base):
     __tablename__ = "media_assets"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -59,3 +82,56 @@ class MediaAsset(Base):
     title = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
     photo_url = Column(String(512), nullable=False)
+    position = Column(Integer, nullable=True)
+
+
+class StoredBlob(Base):
+    __tablename__ = "stored_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    path = Column(String(512), unique=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Last time an upload resolved to this blob; an unreferenced blob is kept for the GC grace
+    # period after it, since the uploader's form may not have taken its reference yet.
+    uploaded_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ImageMetadata(Base):
+    """Dimensions and placeholder of a stored image, computed once alongside its variants."""
+
+    __tablename__ = "image_metadata"
+
+    path = Column(String(512), primary_key=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    bytes = Column(BigInteger, nullable=False)
+    color = Column(String(7), nullable=False)
+    placeholder = Column(Text, nullable=False)
+
+
+class SearchDocument(Base):
+    """Per-language searchable text of a service, doctor or review, rebuilt whenever the row changes."""
+
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)
+    ref_id = Column(Integer, nullable=False)
+    lang = Column(String(2), nullable=False)
+    title = Column(Text, nullable=False, default="")
+    body = Column(Text, nullable=False, default="")
+
+    __table_args__ = (Index("ix_search_documents_ref", "kind", "ref_id"),)
+
+
+class ContentGeneration(Base):
+    """Per-section change counter shared by every worker; bumped in the transaction of each content write."""
+
+    __tablename__ = "content_generations"
+
+    section = Column(String(100), primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    # Unix time of the last bump, used for Last-Modified.
+    modified = Column(Float, nullable=False)
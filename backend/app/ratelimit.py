@@ -0,0 +1,131 @@
+import ipaddress
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import HTTPException, Request
+
+from .config import get_settings
+from .metrics import callback_rejected
+
+settings = get_settings()
+
+# How long a caller waits for a free slot before being told to come back later.
+SLOT_WAIT = 0.5
+BUSY_RETRY_AFTER = 1
+
+
+class TokenBucket:
+    """Per-key token buckets kept in a bounded LRU.
+
+    Each key costs one (tokens, updated) tuple. When the table is full the least
+    recently seen key is dropped, which only ever forgives a client, so memory stays
+    bounded however many distinct keys arrive.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str) -> float:
+        """Spend one token for ``key``; returns 0 when allowed, else seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class Backpressure:
+    """Caps concurrent callback inserts so a burst queues briefly instead of piling onto the database."""
+
+    def __init__(self, limit: int):
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        if self._slots is None:
+            yield
+            return
+        if not self._slots.acquire(timeout=SLOT_WAIT):
+            callback_rejected.inc("busy")
+            raise HTTPException(status_code=503, detail="Too many requests in flight", headers={"Retry-After": str(BUSY_RETRY_AFTER)})
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+def parse_networks(value: str) -> list:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+TRUSTED_PROXIES = parse_networks(settings.trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """The peer address, or nginx's X-Real-IP when the peer is a trusted proxy."""
+    peer = request.client.host if request.client else ""
+    forwarded = request.headers.get("x-real-ip")
+    if not forwarded:
+        return peer
+    try:
+        trusted = any(ipaddress.ip_address(peer) in network for network in TRUSTED_PROXIES)
+    except ValueError:
+        trusted = False
+    return forwarded.strip() if trusted else peer
+
+
+def normalize_phone(phone: str) -> str:
+    digits = re.sub(r"\D", "", phone)
+    # Local "8 7xx ..." and international "+7 7xx ..." are the same number.
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+
+def reject(reason: str, wait: float):
+    callback_rejected.inc(reason)
+    raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+
+class CallbackLimiter:
+    def __init__(self):
+        self.by_ip = TokenBucket(settings.callback_ip_per_minute / 60, settings.callback_ip_burst, settings.rate_limit_max_keys)
+        self.by_phone = TokenBucket(settings.callback_phone_per_hour / 3600, settings.callback_phone_burst, settings.rate_limit_max_keys)
+        self.backpressure = Backpressure(settings.callback_max_concurrency)
+
+    def check(self, request: Request, phone: str):
+        """Raise 429 with Retry-After when either the client address or the phone number is over its rate."""
+        wait = self.by_ip.take(client_ip(request))
+        if wait:
+            reject("ip", wait)
+        wait = self.by_phone.take(normalize_phone(phone))
+        if wait:
+            reject("phone", wait)
+
+    def tracked_keys(self) -> int:
+        return len(self.by_ip) + len(self.by_phone)
+
+
+callback_limiter = CallbackLimiter()
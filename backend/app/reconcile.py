@@ -0,0 +1,256 @@
+import argparse
+import fcntl
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete as sql_delete, func, select, union_all, update
+from sqlalchemy.orm import Session
+
+from .backends import StoredObject
+from .config import get_settings
+from .database import SessionLocal, engine
+from .models import Doctor, ImageMetadata, MediaAsset, Review, StoredBlob
+from .storage import BASE_PATH, BLOB_PREFIX, backend, relative_path, releasable
+from .uploads import sweep_sessions
+
+settings = get_settings()
+logger = logging.getLogger("visus.reconcile")
+
+LOCK_PATH = BASE_PATH / ".reconcile.lock"
+# pg_advisory_lock key shared by every process and container using the database.
+ADVISORY_LOCK_KEY = 0x76697375_6763
+REFERENCE_COLUMNS = (Doctor.photo_url, MediaAsset.photo_url, Review.poster_url, Review.video_url)
+READ_BATCH = 1000
+DELETE_BATCH = 500
+
+
+def candidate_keys(url: str) -> list[str]:
+    """Keys a URL outside this store's public base may still mean: every trailing run of its path segments."""
+    if "<" in url or any(char.isspace() for char in url):
+        # Embed markup (e.g. an Instagram video review), not a stored object.
+        return []
+    parts = [part for part in urlsplit(url).path.split("/") if part]
+    return ["/".join(parts[start:]) for start in range(len(parts))]
+
+
+def collect_references(db: Session, unresolved: list[str] | None = None) -> Counter:
+    """Count references per storage key across every media column in a single streamed UNION ALL.
+
+    A value that names no key of this store (another host, a changed public URL) is not
+    dropped: each key it could mean counts as referenced, so the file it points at is
+    never taken for an orphan. Such values are appended to ``unresolved`` when given.
+    """
+    query = union_all(*(select(column.label("url")).where(column.is_not(None), column != "") for column in REFERENCE_COLUMNS))
+    references: Counter = Counter()
+    for batch in db.execute(query.execution_options(yield_per=READ_BATCH)).scalars().partitions():
+        for url in batch:
+            key = relative_path(url)
+            if key:
+                references[key] += 1
+                continue
+            references.update(candidate_keys(url))
+            if unresolved is not None:
+                unresolved.append(url)
+    return references
+
+
+def owner_key(key: str, references: Counter) -> str | None:
+    """The referenced key ``key`` belongs to: itself, or the original behind a "<original>.<suffix>" sibling."""
+    candidate = key
+    while True:
+        if candidate in references:
+            return candidate
+        head, dot, tail = candidate.rpartition(".")
+        if not dot or "/" in tail:
+            return None
+        candidate = head
+
+
+def recount_blobs(db: Session, references: Counter, dry_run: bool) -> int:
+    """Bring stored_blobs.ref_count in line with the actual references; returns the number of drifted rows."""
+    drifted = [
+        (path, seen, references.get(path, 0))
+        for path, seen in db.execute(select(StoredBlob.path, StoredBlob.ref_count))
+        if seen != references.get(path, 0)
+    ]
+    if dry_run or not drifted:
+        return len(drifted)
+    for path, seen, actual in drifted:
+        # Compare-and-set so a reference taken since the scan is not overwritten.
+        db.execute(update(StoredBlob).where(StoredBlob.path == path, StoredBlob.ref_count == seen).values(ref_count=actual))
+    db.commit()
+    return len(drifted)
+
+
+def purge(db: Session, objects: list[StoredObject], stats: dict, grace_hours: float):
+    keys = [obj.key for obj in objects]
+    blobs = [key for key in keys if key.startswith(BLOB_PREFIX)]
+    if blobs:
+        removed = set(db.scalars(sql_delete(StoredBlob).where(StoredBlob.path.in_(blobs), releasable(grace_hours)).returning(StoredBlob.path)))
+        db.commit()
+        tracked = set(db.scalars(select(StoredBlob.path).where(StoredBlob.path.in_(blobs))))
+        objects = [obj for obj in objects if obj.key not in tracked or obj.key in removed]
+        keys = [obj.key for obj in objects]
+    db.execute(sql_delete(ImageMetadata).where(ImageMetadata.path.in_(keys)))
+    db.commit()
+    backend.remove(keys)
+    stats["deleted"] += len(objects)
+    stats["deleted_bytes"] += sum(obj.size for obj in objects)
+
+
+@contextmanager
+def exclusive() -> Iterator[bool]:
+    """Hold the reconcile lock if it is free; yields whether it was acquired.
+
+    On PostgreSQL this is a session advisory lock, so containers on different hosts
+    sharing the database and bucket never reconcile at once. A SQLite database is
+    single-host by nature and falls back to an flock next to the store.
+    """
+    if engine.dialect.name == "postgresql":
+        # Autocommit, so the connection is not left idle in a transaction for the whole pass.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if not connection.scalar(select(func.pg_try_advisory_lock(ADVISORY_LOCK_KEY))):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                connection.scalar(select(func.pg_advisory_unlock(ADVISORY_LOCK_KEY)))
+        return
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with LOCK_PATH.open("a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def reconcile(dry_run: bool = True, grace_hours: float | None = None) -> dict:
+    """Stream the store once against the referenced keys and remove unreferenced objects older than the grace period.
+
+    Siblings written next to an original (image variants, pre-encoded copies) live and
+    die with it. Memory is bounded by the number of references, not the number of files.
+    References outside the store's public base are reported under ``unresolved``.
+    """
+    grace = settings.media_gc_grace_hours if grace_hours is None else grace_hours
+    cutoff = time.time() - grace * 3600
+    started = time.perf_counter()
+    stats = {
+        "dry_run": dry_run,
+        "grace_hours": grace,
+        "scanned": 0,
+        "scanned_bytes": 0,
+        "referenced": 0,
+        "recent": 0,
+        "orphans": 0,
+        "orphan_bytes": 0,
+        "deleted": 0,
+        "deleted_bytes": 0,
+        "missing": 0,
+        "recounted": 0,
+        "unresolved": 0,
+        "expired_uploads": 0,
+    }
+    with SessionLocal() as db:
+        unresolved: list[str] = []
+        references = collect_references(db, unresolved)
+        stats["unresolved"] = len(unresolved)
+        if unresolved:
+            logger.warning("%s media references are outside %s, e.g. %s", len(unresolved), backend.public_base, unresolved[:5])
+            stats["unresolved_examples"] = unresolved[:10]
+        stats["recounted"] = recount_blobs(db, references, dry_run)
+        found = set()
+        batch: list[StoredObject] = []
+        for obj in backend.iter_objects():
+            stats["scanned"] += 1
+            stats["scanned_bytes"] += obj.size
+            owner = owner_key(obj.key, references)
+            if owner is not None:
+                stats["referenced"] += 1
+                if owner == obj.key:
+                    found.add(owner)
+                continue
+            if obj.modified > cutoff:
+                # Possibly a fresh upload whose form has not been saved yet.
+                stats["recent"] += 1
+                continue
+            stats["orphans"] += 1
+            stats["orphan_bytes"] += obj.size
+            if not dry_run:
+                batch.append(obj)
+                if len(batch) >= DELETE_BATCH:
+                    purge(db, batch, stats, grace)
+                    batch = []
+        if batch:
+            purge(db, batch, stats, grace)
+    if not dry_run:
+        # Chunk sessions live under a dot-directory the store listing never yields.
+        stats["expired_uploads"] = sweep_sessions()
+    guessed = {key for url in unresolved for key in candidate_keys(url)}
+    stats["missing"] = len(references.keys() - found - guessed)
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return stats
+
+
+class ReconcileTask:
+    """Runs reconcile(dry_run=False) every ``interval`` seconds; only one worker per store does the pass."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_report: dict | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="media-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with exclusive() as acquired:
+                    if not acquired:
+                        continue
+                    self.last_report = reconcile(dry_run=False)
+            except Exception:
+                logger.exception("Media reconciliation failed")
+                continue
+            logger.info("Media reconciliation: %s", self.last_report)
+
+
+reconcile_task = ReconcileTask(settings.media_gc_interval)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.reconcile", description="Find and remove media files nothing references.")
+    parser.add_argument("--delete", action="store_true", help="Delete orphans instead of only reporting them")
+    parser.add_argument("--grace-hours", type=float, help=f"Keep orphans younger than this (default {settings.media_gc_grace_hours})")
+    args = parser.parse_args(argv)
+    with exclusive() as acquired:
+        if not acquired:
+            print("Another reconciliation is running", file=sys.stderr)
+            return 1
+        report = reconcile(dry_run=not args.delete, grace_hours=args.grace_hours)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,35 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+from .images import variant_urls
+
+LANGUAGES = ("ru", "kk")
 
 
 class CamelModel(BaseModel):
-    class Config:
-        allow_population_by_field_name = True
-        populate_by_name = True
-        from_attributes = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    # Datetimes already serialize as ISO 8601 in pydantic v2, so no json_encoders are needed.
+    model_config = ConfigDict(populate_by_name=True, from_attributes=True)
+
+    def localized(self, lang: str) -> dict:
+        """Dump by alias keeping only the `lang` side of each `_ru`/`_kk` pair, falling back to the other one when empty."""
+        data = self.model_dump(by_alias=True)
+        fields = type(self).model_fields
+        for name, field in fields.items():
+            base, _, suffix = name.rpartition("_")
+            if suffix in LANGUAGES and suffix != lang:
+                kept = fields[f"{base}_{lang}"].alias
+                data[kept] = data[kept] or data[field.alias]
+                del data[field.alias]
+        return data
+
+
+class ImageMetadataRead(CamelModel):
+    image_width: Optional[int] = Field(default=None, alias="imageWidth")
+    image_height: Optional[int] = Field(default=None, alias="imageHeight")
+    image_bytes: Optional[int] = Field(default=None, alias="imageBytes")
+    image_color: Optional[str] = Field(default=None, alias="imageColor")
+    image_placeholder: Optional[str] = Field(default=None, alias="imagePlaceholder")
 
 
 class DoctorBase(CamelModel):
@@ -24,8 +45,14 @@ class DoctorCreate(DoctorBase):
     pass
 
 
-class DoctorRead(DoctorBase):
+class DoctorRead(ImageMetadataRead, DoctorBase):
     id: int
+    position: Optional[int] = None
+
+    @computed_field
+    @property
+    def variants(self) -> Dict[str, Dict[str, str]]:
+        return variant_urls(self.photo_url, self.image_width is not None)
 
 
 class ServiceBase(CamelModel):
@@ -60,8 +87,9 @@ class ReviewCreate(ReviewBase):
     pass
 
 
-class ReviewRead(ReviewBase):
+class ReviewRead(ImageMetadataRead, ReviewBase):
     id: int
+    position: Optional[int] = None
 
 
 class CallbackCreate(BaseModel):
@@ -76,8 +104,17 @@ class CallbackRead(BaseModel):
     status: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CallbackPage(CamelModel):
+    items: List[CallbackRead]
+    next_cursor: Optional[str] = Field(default=None, alias="nextCursor")
+
+
+class CallbackStatusUpdate(CamelModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+    status: str
 
 
 class MediaAssetBase(CamelModel):
@@ -91,5 +128,79 @@ class MediaAssetCreate(MediaAssetBase):
     pass
 
 
-class MediaAssetRead(MediaAssetBase):
+class MediaAssetRead(ImageMetadataRead, MediaAssetBase):
+    id: int
+    position: Optional[int] = None
+
+    @computed_field
+    @property
+    def variants(self) -> Dict[str, Dict[str, str]]:
+        return variant_urls(self.photo_url, self.image_width is not None)
+
+
+class DoctorUpdate(DoctorCreate):
+    id: int
+
+
+class DoctorBatch(CamelModel):
+    """Creates, updates, deletes and a new display order (ids, first to last), applied in one transaction."""
+
+    create: List[DoctorCreate] = Field(default_factory=list, max_length=500)
+    update: List[DoctorUpdate] = Field(default_factory=list, max_length=500)
+    delete: List[int] = Field(default_factory=list, max_length=500)
+    order: Optional[List[int]] = Field(default=None, max_length=1000)
+
+
+class ReviewUpdate(ReviewCreate):
     id: int
+
+
+class ReviewBatch(CamelModel):
+    create: List[ReviewCreate] = Field(default_factory=list, max_length=500)
+    update: List[ReviewUpdate] = Field(default_factory=list, max_length=500)
+    delete: List[int] = Field(default_factory=list, max_length=500)
+    order: Optional[List[int]] = Field(default=None, max_length=1000)
+
+
+class MediaAssetUpdate(MediaAssetCreate):
+    id: int
+
+
+class MediaAssetBatch(CamelModel):
+    create: List[MediaAssetCreate] = Field(default_factory=list, max_length=500)
+    update: List[MediaAssetUpdate] = Field(default_factory=list, max_length=500)
+    delete: List[int] = Field(default_factory=list, max_length=500)
+    order: Optional[List[int]] = Field(default=None, max_length=1000)
+
+
+class SearchResult(CamelModel):
+    kind: str
+    id: int
+    title: str
+    snippet: str
+    rank: float
+
+
+class SearchResponse(CamelModel):
+    query: str
+    lang: str
+    results: List[SearchResult]
+
+
+class UploadInit(CamelModel):
+    filename: str
+    size: int = Field(ge=0)
+    folder: str = "media"
+    object_name: Optional[str] = Field(default=None, alias="objectName")
+    sha256: Optional[str] = None
+
+
+class PresignedUploadInit(CamelModel):
+    filename: str
+    size: int = Field(ge=0)
+    folder: str = "media"
+    content_type: Optional[str] = Field(default=None, alias="contentType")
+
+
+class PresignedUploadComplete(CamelModel):
+    key: str
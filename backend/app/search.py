@@ -0,0 +1,213 @@
+import html
+import json
+import logging
+import re
+import sys
+from typing import Iterable
+
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Doctor, Review, SearchDocument, ServiceItem
+from .schemas import LANGUAGES
+
+logger = logging.getLogger("visus.search")
+
+INDEXED = {ServiceItem: "service", Doctor: "doctor", Review: "review"}
+# Kazakh has no Snowball stemmer in Postgres, so it is indexed unstemmed.
+TEXT_SEARCH_CONFIGS = {"ru": "russian", "kk": "simple"}
+MAX_TERMS = 8
+# Highlight markers that cannot occur in admin text; swapped for <mark> after escaping.
+MARK_START, MARK_END = "\x02", "\x03"
+
+POSTGRES_DDL = [
+    *(
+        f"CREATE INDEX IF NOT EXISTS ix_search_documents_{lang} ON search_documents "
+        f"USING gin (to_tsvector('{config}', title || ' ' || body)) WHERE lang = '{lang}'"
+        for lang, config in TEXT_SEARCH_CONFIGS.items()
+    ),
+]
+POSTGRES_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_trgm ON search_documents USING gin ((title || ' ' || body) gin_trgm_ops)",
+]
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+    "title, body, lang UNINDEXED, content='search_documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, title, body, lang) VALUES (new.id, new.title, new.body, new.lang); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body, lang) VALUES ('delete', old.id, old.title, old.body, old.lang); END",
+    "INSERT INTO search_fts(search_fts) VALUES ('rebuild')",
+]
+
+
+def _pick(row, field: str, lang: str) -> str:
+    """The `lang` side of a `_ru`/`_kk` pair, falling back to the other one when empty (as /api/site does)."""
+    other = next(code for code in LANGUAGES if code != lang)
+    return getattr(row, f"{field}_{lang}") or getattr(row, f"{field}_{other}") or ""
+
+
+def documents(kind: str, row) -> list[dict]:
+    docs = []
+    for lang in LANGUAGES:
+        if kind == "service":
+            title, parts = _pick(row, "title", lang), [_pick(row, "short_description", lang), _pick(row, "full_description", lang)]
+        elif kind == "doctor":
+            title, parts = row.name, [row.role, _pick(row, "description", lang)]
+        else:
+            title, parts = row.patient_name, [_pick(row, "text", lang)]
+        docs.append({"kind": kind, "ref_id": row.id, "lang": lang, "title": title or "", "body": "\n".join(p for p in parts if p)})
+    return docs
+
+
+def touch(db: Session, model, rows: Iterable):
+    """Queue rows (ids, or instances not flushed yet) for reindexing in the same transaction, right before it commits."""
+    if model in INDEXED:
+        db.info.setdefault("search_dirty", {}).setdefault(model, set()).update(rows)
+
+
+def reindex(db: Session, model, ids: Iterable[int] | None = None):
+    """Rewrite the documents of ``ids`` (every row when None); deleted or inactive rows just lose theirs."""
+    kind = INDEXED[model]
+    stale = delete(SearchDocument).where(SearchDocument.kind == kind)
+    query = select(model)
+    if ids is not None:
+        ids = list(ids)
+        stale = stale.where(SearchDocument.ref_id.in_(ids))
+        query = query.where(model.id.in_(ids))
+    if model is ServiceItem:
+        query = query.where(ServiceItem.is_active.is_(True))
+    db.execute(stale)
+    rows = [doc for row in db.scalars(query) for doc in documents(kind, row)]
+    if rows:
+        db.execute(insert(SearchDocument), rows)
+
+
+def rebuild(db: Session):
+    for model in INDEXED:
+        reindex(db, model)
+    db.commit()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _reindex_dirty(session: Session):
+    if "search_dirty" not in session.info:
+        return
+    # Flushed first so new instances have ids and the reindex reads the committed values.
+    session.flush()
+    for model, rows in session.info.pop("search_dirty").items():
+        reindex(session, model, {row if isinstance(row, int) else row.id for row in rows})
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_dirty(session: Session):
+    session.info.pop("search_dirty", None)
+
+
+def ensure_index(bind: Engine):
+    """Create the dialect's full-text structures and fill the document table on first run."""
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as connection:
+            for statement in POSTGRES_DDL:
+                connection.exec_driver_sql(statement)
+        try:
+            with bind.begin() as connection:
+                for statement in POSTGRES_TRIGRAM_DDL:
+                    connection.exec_driver_sql(statement)
+        except DBAPIError:
+            # Creating the extension needs elevated rights; substring matches then just scan.
+            logger.warning("pg_trgm unavailable; substring search will not be indexed")
+    elif bind.dialect.name == "sqlite":
+        with bind.begin() as connection:
+            for statement in SQLITE_DDL:
+                connection.exec_driver_sql(statement)
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(SearchDocument)) == 0:
+            rebuild(db)
+
+
+def terms(query: str) -> list[str]:
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def highlight(value: str) -> str:
+    return html.escape(value).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+async def _search_postgres(db: AsyncSession, words: list[str], raw: str, lang: str, limit: int):
+    config = TEXT_SEARCH_CONFIGS[lang]
+    # The config is spelled out (not bound) so the planner can match the partial expression index.
+    document = f"to_tsvector('{config}', title || ' ' || body)"
+    statement = text(f"""
+        SELECT kind, ref_id,
+               ts_headline('{config}', title, query, :title_options) AS title,
+               ts_headline('{config}', body, query, :snippet_options) AS snippet,
+               ts_rank({document}, query) AS rank
+        FROM search_documents, to_tsquery('{config}', :tsquery) AS query
+        WHERE lang = :lang AND ({document} @@ query OR (title || ' ' || body) ILIKE :pattern)
+        ORDER BY rank DESC, kind, ref_id
+        LIMIT :limit
+    """)
+    escaped = raw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    marks = f"StartSel={MARK_START}, StopSel={MARK_END}"
+    result = await db.execute(statement, {
+        "tsquery": " & ".join(f"{word}:*" for word in words),
+        "pattern": f"%{escaped}%",
+        "lang": lang,
+        "limit": limit,
+        "title_options": f"{marks}, HighlightAll=true",
+        "snippet_options": f"{marks}, MaxFragments=2, MaxWords=24, MinWords=8",
+    })
+    return result.all()
+
+
+async def _search_sqlite(db: AsyncSession, words: list[str], raw: str, lang: str, limit: int):
+    # Every word must match, each as a prefix; quoting keeps FTS5 operators out of user input.
+    match = " ".join(f'"{word}"*' for word in words)
+    statement = text("""
+        SELECT d.kind, d.ref_id,
+               highlight(search_fts, 0, :start, :end) AS title,
+               snippet(search_fts, 1, :start, :end, '…', 24) AS snippet,
+               -bm25(search_fts, 5.0, 1.0) AS rank
+        FROM search_fts JOIN search_documents AS d ON d.id = search_fts.rowid
+        WHERE search_fts MATCH :match AND search_fts.lang = :lang
+        ORDER BY rank DESC, d.kind, d.ref_id
+        LIMIT :limit
+    """)
+    result = await db.execute(statement, {"match": match, "lang": lang, "limit": limit, "start": MARK_START, "end": MARK_END})
+    return result.all()
+
+
+async def search(db: AsyncSession, query: str, lang: str, limit: int) -> list[dict]:
+    words = terms(query)
+    if not words:
+        return []
+    if db.bind.dialect.name == "postgresql":
+        rows = await _search_postgres(db, words, query.strip(), lang, limit)
+    else:
+        rows = await _search_sqlite(db, words, query.strip(), lang, limit)
+    return [
+        {"kind": kind, "id": ref_id, "title": highlight(title or ""), "snippet": highlight(snippet or ""), "rank": float(rank)}
+        for kind, ref_id, title, snippet, rank in rows
+    ]
+
+
+def main() -> int:
+    from .database import engine
+
+    ensure_index(engine)
+    with SessionLocal() as db:
+        rebuild(db)
+        counts = dict(db.execute(select(SearchDocument.kind, func.count()).group_by(SearchDocument.kind)).all())
+    json.dump(counts, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from . import models
 
@@ -66,3 +70,63 @@ def seed_data(db: Session):
         db.add_all(reviews)
 
     db.commit()
+
+
+# Row counts for synthetic data sets used by the benchmark suite.
+SCALES = {
+    "small": {"doctors": 20, "services": 30, "reviews": 100, "media": 200, "callbacks": 5_000},
+    "large": {"doctors": 200, "services": 60, "reviews": 2_000, "media": 5_000, "callbacks": 100_000},
+}
+BATCH_SIZE = 5_000
+
+
+def seed_synthetic(db: Session, scale: str = "small", seed: int = 0):
+    """Seed the demo content, then top every table up to the row counts of ``scale`` with deterministic filler."""
+    seed_data(db)
+    counts = SCALES[scale]
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def fill(model, target: int, make):
+        existing = db.query(model).count()
+        for offset in range(existing, target, BATCH_SIZE):
+            db.execute(insert(model), [make(i) for i in range(offset, min(offset + BATCH_SIZE, target))])
+            db.commit()
+
+    fill(models.Doctor, counts["doctors"], lambda i: {
+        "name": f"Врач {i}",
+        "role": rng.choice(["Врач-офтальмолог", "Детский офтальмолог", "Хирург"]),
+        "experience_years": rng.randint(1, 35),
+        "description_ru": "Диагностика и лечение. " * rng.randint(2, 8),
+        "description_kk": "Диагностика және емдеу. " * rng.randint(2, 8),
+        "photo_url": f"doctors/synthetic-{i}.jpg",
+    })
+    fill(models.ServiceItem, counts["services"], lambda i: {
+        "slug": f"service-{i}",
+        "title_ru": f"Услуга {i}",
+        "title_kk": f"Қызмет {i}",
+        "short_description_ru": "Краткое описание услуги. " * 3,
+        "short_description_kk": "Қызметтің қысқаша сипаттамасы. " * 3,
+        "full_description_ru": "Подробное описание услуги. " * 20,
+        "full_description_kk": "Қызметтің толық сипаттамасы. " * 20,
+        "is_active": rng.random() > 0.1,
+    })
+    fill(models.Review, counts["reviews"], lambda i: {
+        "patient_name": f"Пациент {i}",
+        "rating": rng.randint(3, 5),
+        "text_ru": "Всё понравилось. " * rng.randint(1, 10),
+        "text_kk": "Бәрі ұнады. " * rng.randint(1, 10),
+        "poster_url": f"reviews/synthetic-{i}.jpg",
+    })
+    fill(models.MediaAsset, counts["media"], lambda i: {
+        "category": "diagnostics" if i % 2 else "interior",
+        "title": f"Фото {i}",
+        "description": "Оборудование и интерьер центра.",
+        "photo_url": f"media/synthetic-{i}.jpg",
+    })
+    fill(models.CallbackRequest, counts["callbacks"], lambda i: {
+        "name": f"Клиент {i}",
+        "phone": f"+7 7{rng.randint(0, 99):02d} {rng.randint(0, 9_999_999):07d}",
+        "status": rng.choice(["NEW", "NEW", "IN_PROGRESS", "DONE", "CANCELLED"]),
+        "created_at": start + timedelta(seconds=i * 97),
+    })
@@ -0,0 +1,186 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from .compression import compress
+from .config import get_settings
+from .database import SessionLocal
+
+settings = get_settings()
+logger = logging.getLogger("visus.snapshot")
+
+RETRY_DELAY = 5.0
+# How often the leader looks for publish requests touched in by other workers.
+SIGNAL_POLL = 1.0
+
+
+class SnapshotPublisher:
+    """Renders public payloads to static JSON releases that a web server can serve without the API.
+
+    Layout under ``root``::
+
+        releases/<release>/api/doctors.json (+ .gz sibling for nginx gzip_static)
+        current -> releases/<release>
+
+    A release is written in full under a hidden name, renamed into place and then
+    published by swapping the ``current`` symlink, so readers always see one
+    consistent set. Writers in several processes are serialized with an flock, and
+    only the worker holding the ``.leader`` flock publishes in the background; the
+    others wait to take over if it exits. Followers pass their own requests on by
+    touching ``.pending``, so edits made through any worker are published even
+    when nothing polls content_generations.
+    """
+
+    def __init__(self, root: Path, render: Callable[[Session], dict[str, bytes]], delay: float, keep: int):
+        self.root = root
+        self.render = render
+        self.delay = delay
+        self.keep = max(keep, 1)
+        self.last_release: dict | None = None
+        self._dirty = False
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self._pending = root / ".pending"
+        self._pending_seen: int | None = None
+        self.leading = False
+
+    def start(self):
+        (self.root / "releases").mkdir(parents=True, exist_ok=True)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def request(self, sections=None):
+        """Schedule a publish; bursts of admin writes within the delay collapse into one release."""
+        with self._lock:
+            self._dirty = True
+            self._wakeup.notify()
+        if not self.leading:
+            try:
+                self._pending.touch()
+            except OSError:
+                logger.exception("Could not signal the publishing worker")
+
+    def _pending_mark(self) -> int | None:
+        try:
+            return self._pending.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def publish(self) -> dict:
+        releases = self.root / "releases"
+        releases.mkdir(parents=True, exist_ok=True)
+        with (self.root / ".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Rendered under the lock so a slower writer can never switch in older content.
+            with SessionLocal() as db:
+                documents = self.render(db)
+            name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+            staging = releases / f".{name}"
+            manifest = {"release": name, "publishedAt": datetime.now(timezone.utc).isoformat(), "files": {}}
+            for document, body in documents.items():
+                path = staging / f"{document}.json"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(body)
+                path.with_name(f"{path.name}.gz").write_bytes(compress(body, "gzip", best=True))
+                manifest["files"][f"{document}.json"] = hashlib.sha256(body).hexdigest()
+            (staging / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            os.replace(staging, releases / name)
+            # A relative link keeps working when the directory is mounted elsewhere (e.g. read-only into nginx).
+            link = self.root / f".current-{uuid.uuid4().hex}"
+            os.symlink(Path("releases") / name, link)
+            os.replace(link, self.root / "current")
+            self._prune(releases, name)
+        self.last_release = manifest
+        return manifest
+
+    def _prune(self, releases: Path, current: str):
+        names = sorted(path.name for path in releases.iterdir() if not path.name.startswith("."))
+        for stale in names[:-self.keep]:
+            if stale != current:
+                shutil.rmtree(releases / stale, ignore_errors=True)
+
+    def _lead(self, leader) -> bool:
+        """Block until ``leader`` is flock'ed by this process; False when stopped first."""
+        while True:
+            try:
+                fcntl.flock(leader, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                with self._lock:
+                    if self._stopping:
+                        return False
+                    self._wakeup.wait(RETRY_DELAY)
+                continue
+            with self._lock:
+                # Whatever changed while another worker led is covered by one publish on takeover.
+                self._dirty = True
+                self._pending_seen = self._pending_mark()
+            self.leading = True
+            return True
+
+    def _run(self):
+        with (self.root / ".leader").open("a") as leader:
+            if self._lead(leader):
+                self._publish_changes()
+            self.leading = False
+
+    def _publish_changes(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._stopping:
+                    self._wakeup.wait(SIGNAL_POLL)
+                    if self._pending_mark() != self._pending_seen:
+                        self._dirty = True
+                if self._stopping:
+                    return
+            # Let the rest of a burst of admin edits land before rendering.
+            time.sleep(self.delay)
+            with self._lock:
+                self._dirty = False
+                self._pending_seen = self._pending_mark()
+            try:
+                manifest = self.publish()
+            except Exception:
+                logger.exception("Snapshot publish failed; retrying")
+                with self._lock:
+                    self._dirty = True
+                    self._wakeup.wait(RETRY_DELAY)
+                continue
+            logger.info("Published snapshot %s", manifest["release"])
+
+
+def main() -> int:
+    from .main import publisher
+
+    if publisher is None:
+        print("PUBLISH_PATH is not set", file=sys.stderr)
+        return 1
+    json.dump(publisher.publish(), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
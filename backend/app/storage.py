@@ -1,38 +1,226 @@
-import os
-import shutil
+import hashlib
+import time
 import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from fastapi import UploadFile
+from typing import NamedTuple
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, delete as sql_delete, event, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .backends import create_backend
 from .config import get_settings
+from .database import SessionLocal
+from .metrics import observe_upload
+from .models import StoredBlob
 
 settings = get_settings()
 
 BASE_PATH = Path(settings.local_storage_path)
 BASE_PATH.mkdir(parents=True, exist_ok=True)
+BASE_ROOT = BASE_PATH.resolve()
+TMP_PATH = BASE_PATH / ".tmp"
+BLOB_PREFIX = "cas/"
+CHUNK_SIZE = 1024 * 1024
 
+# Committed objects go to the configured backend; BASE_PATH stays the local staging area.
+backend = create_backend(BASE_PATH)
+
+
+def public_url(rel_path: str) -> str:
+    return backend.url(rel_path)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StoredFile(NamedTuple):
+    url: str
+    path: str
+    sha256: str | None
+    size: int
+
+
+def new_temp_path() -> Path:
+    TMP_PATH.mkdir(parents=True, exist_ok=True)
+    return TMP_PATH / uuid.uuid4().hex
+
+
+def check_size(size: int):
+    if size > settings.max_upload_bytes:
+        raise UploadTooLarge(f"File exceeds {settings.max_upload_bytes} bytes")
 
-def save_file(file: UploadFile, folder: str | None, desired_name: str | None) -> tuple[str, str]:
-    folder_name = (folder or "media").strip("/")
-    target_folder = BASE_PATH / folder_name
-    target_folder.mkdir(parents=True, exist_ok=True)
 
-    filename = desired_name.strip("/") if desired_name else f"{uuid.uuid4().hex}_{file.filename}"
+def object_key(folder: str | None, filename: str | None, desired_name: str | None) -> str:
+    folder_name = (folder or "media").strip("/")
+    filename = desired_name.strip("/") if desired_name else f"{uuid.uuid4().hex}_{filename}"
     filename = filename.replace("media/", "")
-    path = target_folder / filename
-    with path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    rel_path = f"{folder_name}/{filename}".lstrip("/")
-    url = f"{settings.local_public_url.rstrip('/')}/{rel_path}"
-    return url, rel_path
+    return f"{folder_name}/{filename}".lstrip("/")
+
+
+def commit_temp(
+    db: Session | None, tmp: Path, digest: str, size: int, filename: str | None, folder: str | None, desired_name: str | None
+) -> StoredFile:
+    """Move a fully received temp file to its final location."""
+    if settings.storage_dedup and not desired_name and db is not None:
+        rel_path = register_blob(db, tmp, digest, size, filename)
+        return StoredFile(public_url(rel_path), rel_path, digest, size)
+
+    rel_path = object_key(folder, filename, desired_name)
+    backend.put(tmp, rel_path)
+    return StoredFile(public_url(rel_path), rel_path, digest, size)
+
+
+def save_file(file: UploadFile, folder: str | None, desired_name: str | None, db: Session | None = None) -> StoredFile:
+    started = time.perf_counter()
+    tmp = new_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp.open("wb") as buffer:
+            while chunk := file.file.read(CHUNK_SIZE):
+                size += len(chunk)
+                check_size(size)
+                digest.update(chunk)
+                buffer.write(chunk)
+        stored = commit_temp(db, tmp, digest.hexdigest(), size, file.filename, folder, desired_name)
+        observe_upload(started, size)
+        return stored
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def save_upload(file: UploadFile, folder: str | None, desired_name: str | None, db: Session | None = None) -> StoredFile:
+    """Async counterpart of save_file that never parks a threadpool worker on the whole copy."""
+    started = time.perf_counter()
+    tmp = new_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                check_size(size)
+                digest.update(chunk)
+                await buffer.write(chunk)
+        stored = await run_in_threadpool(commit_temp, db, tmp, digest.hexdigest(), size, file.filename, folder, desired_name)
+        observe_upload(started, size)
+        return stored
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def register_blob(db: Session, tmp: Path, digest: str, size: int, filename: str | None) -> str:
+    now = datetime.now(timezone.utc)
+    blob = db.get(StoredBlob, digest)
+    if blob is None:
+        suffix = Path(filename or "").suffix.lower()
+        blob = StoredBlob(digest=digest, path=f"{BLOB_PREFIX}{digest[:2]}/{digest}{suffix}", size=size, ref_count=0, uploaded_at=now)
+        db.add(blob)
+        try:
+            db.flush()
+        except IntegrityError:
+            # A concurrent upload of the same bytes registered the digest first.
+            db.rollback()
+            blob = db.get(StoredBlob, digest)
+    # Protects a deduplicated blob from a concurrent release of its last reference until the uploader retains it.
+    blob.uploaded_at = now
+    db.flush()
+    if not backend.exists(blob.path):
+        backend.put(tmp, blob.path)
+    db.commit()
+    return blob.path
 
 
-def delete_file(object_name: str):
+def blob_path(object_name: str | None) -> str | None:
+    rel = relative_path(object_name)
+    if not rel or not rel.startswith(BLOB_PREFIX):
+        return None
+    return rel
+
+
+def releasable(grace_hours: float | None = None):
+    """Blob rows that may go: unreferenced and not handed out by an upload within the grace period."""
+    grace = settings.media_gc_grace_hours if grace_hours is None else grace_hours
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace)
+    return and_(StoredBlob.ref_count <= 0, or_(StoredBlob.uploaded_at.is_(None), StoredBlob.uploaded_at < cutoff))
+
+
+def retain(db: Session, object_name: str | None):
+    rel = blob_path(object_name)
+    if rel and not db.execute(update(StoredBlob).where(StoredBlob.path == rel).values(ref_count=StoredBlob.ref_count + 1)).rowcount:
+        raise HTTPException(status_code=409, detail=f"Stored file {rel} no longer exists; upload it again")
+
+
+def release(db: Session, object_name: str | None, delete_untracked: bool = True):
+    """Drop one reference; the file itself is removed after the transaction commits."""
     if not object_name:
         return
-    cleaned = object_name.lstrip("/").replace("media/", "")
-    path = BASE_PATH / cleaned
-    if path.exists():
-        try:
-            path.unlink()
-        except OSError:
-            pass
+    rel = blob_path(object_name)
+    remaining = None
+    if rel:
+        remaining = db.scalar(
+            update(StoredBlob)
+            .where(StoredBlob.path == rel)
+            .values(ref_count=StoredBlob.ref_count - 1)
+            .returning(StoredBlob.ref_count)
+        )
+    if remaining is None:
+        if delete_untracked:
+            db.info.setdefault("released_files", []).append(object_name)
+        return
+    if remaining <= 0 and db.execute(sql_delete(StoredBlob).where(StoredBlob.path == rel, releasable())).rowcount:
+        db.info.setdefault("released_files", []).append(rel)
+
+
+def swap(db: Session, old: str | None, new: str | None):
+    if old == new:
+        return
+    retain(db, new)
+    release(db, old, delete_untracked=False)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _purge_released(session: Session):
+    for object_name in session.info.pop("released_files", ()):
+        delete_file(object_name)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_released(session: Session):
+    session.info.pop("released_files", None)
+
+
+def relative_path(object_name: str | None) -> str | None:
+    if not object_name:
+        return None
+    public_prefix = f"{backend.public_base.rstrip('/')}/"
+    if object_name.startswith(public_prefix):
+        cleaned = object_name[len(public_prefix):]
+    elif "://" in object_name:
+        return None
+    elif object_name.startswith("/media/"):
+        # A path under this app's /media mount.
+        cleaned = object_name[len("/media/"):]
+    else:
+        cleaned = object_name.lstrip("/")
+    path = (BASE_ROOT / cleaned).resolve()
+    if not path.is_relative_to(BASE_ROOT):
+        return None
+    return cleaned
+
+
+def delete_file(object_name: str, db: Session | None = None):
+    cleaned = relative_path(object_name)
+    if not cleaned:
+        return
+    if db is not None and cleaned.startswith(BLOB_PREFIX):
+        removed = db.execute(sql_delete(StoredBlob).where(StoredBlob.path == cleaned, releasable())).rowcount
+        db.commit()
+        if not removed and db.scalar(select(StoredBlob.digest).where(StoredBlob.path == cleaned)):
+            return
+    # Responsive variants live next to the original as "<name>.<variant>.<format>" and go with it.
+    backend.delete(cleaned)
@@ -0,0 +1,389 @@
+import argparse
+import gzip
+import io
+import json
+import logging
+import queue
+import sys
+import tarfile
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterable, Iterator
+
+from sqlalchemy import DateTime, String, delete, distinct, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from . import search
+from .cache import mark_changed
+from .database import Base, SessionLocal, engine
+from .models import CallbackRequest, Doctor, ImageMetadata, MediaAsset, Review, ServiceItem, StoredBlob
+from .reconcile import REFERENCE_COLUMNS, collect_references, owner_key, recount_blobs
+from .storage import backend, new_temp_path, relative_path
+
+logger = logging.getLogger("visus.transfer")
+
+FORMAT_VERSION = 1
+TABLES = {model.__tablename__: model for model in (ServiceItem, Doctor, Review, MediaAsset, CallbackRequest, StoredBlob, ImageMetadata)}
+READ_BATCH = 1000
+INSERT_BATCH = 5000
+# Table dumps stay in memory up to this size, then spill to a temporary file.
+SPOOL_BYTES = 8 * 1024 * 1024
+# The export stream hands over ~64 KiB chunks with at most this many in flight.
+STREAM_CHUNK = 64 * 1024
+STREAM_QUEUE = 16
+# Media is already compressed, so the archive favours speed over ratio.
+GZIP_LEVEL = 1
+
+
+class InvalidArchive(ValueError):
+    pass
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def dump_table(db: Session, model, out: BinaryIO) -> int:
+    table = model.__table__
+    columns = list(table.columns.keys())
+    query = select(*table.columns).order_by(*table.primary_key.columns)
+    count = 0
+    # yield_per streams through a server-side cursor on PostgreSQL.
+    for batch in db.execute(query.execution_options(yield_per=READ_BATCH)).partitions():
+        out.write("".join(json.dumps(dict(zip(columns, map(_encode, row))), ensure_ascii=False) + "\n" for row in batch).encode())
+        count += len(batch)
+    return count
+
+
+def _add_member(tar: tarfile.TarFile, name: str, source: BinaryIO, size: int):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    source.seek(0)
+    tar.addfile(info, source)
+
+
+def media_keys(db: Session) -> Iterator[tuple[str, int]]:
+    """Every stored object a row points at, including its derived siblings."""
+    references = collect_references(db)
+    for obj in backend.iter_objects():
+        if owner_key(obj.key, references) is not None:
+            yield obj.key, obj.size
+
+
+def write_archive(out: BinaryIO, tables: Iterable[str] | None = None, with_media: bool = False) -> dict:
+    """Write a gzip'd tar of ``tables/<name>.ndjson`` (plus ``media/<key>`` files) and a closing manifest.json.
+
+    Memory stays constant: rows are read through a server-side cursor and each table is
+    spooled to a temporary file before it is added, since tar needs member sizes up front.
+    """
+    started = time.perf_counter()
+    names = list(tables or TABLES)
+    unknown = set(names) - TABLES.keys()
+    if unknown:
+        raise ValueError(f"Unknown tables: {sorted(unknown)}")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        # Lets the importing environment point URLs carrying this host at its own store.
+        "public_base": backend.public_base,
+        "tables": {},
+        "media": 0,
+        "media_bytes": 0,
+    }
+    with SessionLocal() as db, gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL) as zipped, tarfile.open(fileobj=zipped, mode="w|") as tar:
+        if db.get_bind().dialect.name == "postgresql":
+            # One snapshot for every table, so the archive is consistent under concurrent edits.
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        for name in names:
+            with SpooledTemporaryFile(SPOOL_BYTES) as spool:
+                manifest["tables"][name] = dump_table(db, TABLES[name], spool)
+                _add_member(tar, f"tables/{name}.ndjson", spool, spool.tell())
+        if with_media:
+            for key, size in media_keys(db):
+                with backend.local_copy(key) as path, path.open("rb") as source:
+                    _add_member(tar, f"media/{key}", source, path.stat().st_size)
+                manifest["media"] += 1
+                manifest["media_bytes"] += size
+        body = json.dumps(manifest, indent=2).encode()
+        _add_member(tar, "manifest.json", io.BytesIO(body), len(body))
+    manifest["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return manifest
+
+
+class _QueueWriter:
+    """File-like sink that hands buffered chunks to a bounded queue, giving up once the reader has gone."""
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise ConnectionAbortedError("Export stream closed")
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= STREAM_CHUNK:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+def stream_archive(tables: Iterable[str] | None = None, with_media: bool = False) -> Iterator[bytes]:
+    """Produce the archive on a worker thread and yield it chunk by chunk for a streaming response."""
+    chunks: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+
+    def produce():
+        try:
+            write_archive(writer, tables, with_media)
+            writer.flush()
+            writer.put(None)
+        except ConnectionAbortedError:
+            pass
+        except Exception as exc:
+            logger.exception("Export failed")
+            try:
+                writer.put(exc)
+            except ConnectionAbortedError:
+                pass
+
+    thread = threading.Thread(target=produce, name="content-export", daemon=True)
+    thread.start()
+    try:
+        while (chunk := chunks.get()) is not None:
+            if isinstance(chunk, Exception):
+                # Aborts the response; the archive is left without its manifest and will not import.
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+        thread.join()
+
+
+def _copy_text(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def bulk_insert(db: Session, table, rows: list[dict]):
+    """COPY on PostgreSQL, one executemany elsewhere; runs inside the session's transaction."""
+    if not rows:
+        return
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(insert(table), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(row[column]) for column in columns) + "\n")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def has_serial_id(model) -> bool:
+    return [column.name for column in model.__table__.primary_key.columns] == ["id"]
+
+
+def load_table(db: Session, model, lines: Iterable[bytes], replace: bool) -> int:
+    """Insert one table's NDJSON; integer ids are reassigned by the target, natural keys already present are kept.
+
+    No table refers to another by id (and search documents are rebuilt afterwards), so
+    dropping ids is all the remapping needed; rows keep their exported order.
+    """
+    table = model.__table__
+    serial = has_serial_id(model)
+    dates = {column.name for column in table.columns if isinstance(column.type, DateTime)}
+    if replace:
+        db.execute(delete(table))
+    count = 0
+    lines = iter(lines)
+    while chunk := list(islice(lines, INSERT_BATCH)):
+        rows = []
+        for line in chunk:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            row = {name: data[name] for name in table.columns.keys() if name in data and not (serial and name == "id")}
+            for name in dates & row.keys():
+                if row[name] is not None:
+                    row[name] = datetime.fromisoformat(row[name])
+            rows.append(row)
+        if not serial and not replace and rows:
+            key = next(iter(table.primary_key.columns))
+            present = set(db.scalars(select(key).where(key.in_([row[key.name] for row in rows]))))
+            rows = [row for row in rows if row[key.name] not in present]
+        bulk_insert(db, table, rows)
+        count += len(rows)
+    return count
+
+
+def id_floors(db: Session) -> dict:
+    """Highest id per table holding media URLs; rows above it after a load are the imported ones."""
+    models = {column.class_ for column in REFERENCE_COLUMNS}
+    return {model: db.scalar(select(func.coalesce(func.max(model.id), 0))) for model in models}
+
+
+def rebase_urls(db: Session, source_base: str | None, floors: dict) -> int:
+    """Rewrite imported media URLs under the source environment's public base to this environment's."""
+    if not source_base:
+        return 0
+    source = f"{source_base.rstrip('/')}/"
+    target = f"{backend.public_base.rstrip('/')}/"
+    if source == target:
+        return 0
+    rebased = 0
+    for column in REFERENCE_COLUMNS:
+        model = column.class_
+        statement = (
+            update(model)
+            .where(column.startswith(source, autoescape=True), model.id > floors[model])
+            .values({column: literal(target, String) + func.substr(column, len(source) + 1)})
+            .execution_options(synchronize_session=False)
+        )
+        rebased += db.execute(statement).rowcount
+    return rebased
+
+
+def import_media(key: str, source: BinaryIO) -> int:
+    temp = new_temp_path()
+    try:
+        with temp.open("wb") as target:
+            size = 0
+            while chunk := source.read(1024 * 1024):
+                target.write(chunk)
+                size += len(chunk)
+        backend.put(temp, key)
+    finally:
+        temp.unlink(missing_ok=True)
+    return size
+
+
+def media_sections(db: Session) -> set[str]:
+    return {f"media:{category}" for category in db.scalars(select(distinct(MediaAsset.category)))}
+
+
+def read_archive(source: BinaryIO, replace: bool = False) -> dict:
+    """Load an archive from :func:`write_archive` in a single transaction.
+
+    With ``replace`` every table present in the archive is emptied first, otherwise rows are
+    appended. Nothing is committed unless the closing manifest matches what was read.
+    Media files are written to storage as they arrive; if the import is rolled back the
+    reconciliation job removes them.
+    """
+    started = time.perf_counter()
+    report = {"replace": replace, "tables": {}, "media": 0, "media_bytes": 0}
+    manifest = None
+    with SessionLocal() as db:
+        sections = {"doctors", "services", "reviews", *media_sections(db)}
+        floors = id_floors(db)
+        try:
+            with tarfile.open(fileobj=source, mode="r|*") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    if member.name == "manifest.json":
+                        manifest = json.load(tar.extractfile(member))
+                    elif member.name.startswith("tables/") and member.name.endswith(".ndjson"):
+                        name = member.name[len("tables/"):-len(".ndjson")]
+                        if name not in TABLES:
+                            raise InvalidArchive(f"Unknown table {name}")
+                        report["tables"][name] = load_table(db, TABLES[name], tar.extractfile(member), replace)
+                        if replace and TABLES[name] in floors:
+                            floors[TABLES[name]] = 0
+                    elif member.name.startswith("media/"):
+                        key = relative_path(member.name[len("media/"):])
+                        if not key or key.startswith("."):
+                            raise InvalidArchive(f"Unsafe media path {member.name}")
+                        report["media_bytes"] += import_media(key, tar.extractfile(member))
+                        report["media"] += 1
+        except (tarfile.TarError, EOFError, OSError, json.JSONDecodeError) as exc:
+            raise InvalidArchive(f"Unreadable archive: {exc}") from exc
+        if manifest is None or manifest.get("format") != FORMAT_VERSION:
+            raise InvalidArchive("Missing or unsupported manifest; the archive is incomplete")
+        expected = manifest["tables"]
+        if set(expected) != set(report["tables"]) or manifest.get("media", 0) != report["media"]:
+            raise InvalidArchive("Archive contents do not match its manifest")
+        # When appending, natural-key rows already present are skipped, so only serial tables must match exactly.
+        mismatched = [
+            name for name, count in expected.items()
+            if count != report["tables"][name] and (replace or has_serial_id(TABLES[name]))
+        ]
+        if mismatched:
+            raise InvalidArchive(f"Row counts differ from the manifest for {sorted(mismatched)}")
+        report["rebased"] = rebase_urls(db, manifest.get("public_base"), floors)
+        for model in search.INDEXED:
+            search.reindex(db, model)
+        mark_changed(db, *sections, *media_sections(db))
+        db.commit()
+        report["recounted"] = recount_blobs(db, collect_references(db), dry_run=False)
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.transfer", description="Export or import all site content as a tar.gz of NDJSON tables and media.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Write an archive")
+    export.add_argument("archive", help="Output path, or - for stdout")
+    export.add_argument("--media", action="store_true", help="Include every referenced media file")
+    export.add_argument("--tables", help=f"Comma-separated subset of {','.join(TABLES)}")
+    load = commands.add_parser("import", help="Load an archive in one transaction")
+    load.add_argument("archive", help="Input path, or - for stdin")
+    load.add_argument("--replace", action="store_true", help="Empty the archived tables first instead of appending")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    report_to = sys.stdout
+    try:
+        if args.command == "export":
+            tables = [name.strip() for name in args.tables.split(",")] if args.tables else None
+            if args.archive == "-":
+                report_to = sys.stderr
+                report = write_archive(sys.stdout.buffer, tables, args.media)
+            else:
+                with open(args.archive, "wb") as out:
+                    report = write_archive(out, tables, args.media)
+        else:
+            # A fresh environment may not have been started yet.
+            Base.metadata.create_all(bind=engine)
+            search.ensure_index(engine)
+            if args.archive == "-":
+                report = read_archive(sys.stdin.buffer, args.replace)
+            else:
+                with open(args.archive, "rb") as source:
+                    report = read_archive(source, args.replace)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    json.dump(report, report_to, indent=2)
+    report_to.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
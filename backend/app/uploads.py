@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import anyio
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+from .storage import BASE_PATH, StoredFile, check_size, commit_temp
+
+settings = get_settings()
+
+UPLOADS_PATH = BASE_PATH / ".uploads"
+# Room for multipart boundaries, part headers and form fields around the file bytes.
+MULTIPART_SLACK = 64 * 1024
+
+# Running digests for sessions handled by this process, keyed by upload id and
+# valid only while their byte count and mtime match the part file on disk.
+_hashers: dict[str, tuple[int, int, "hashlib._Hash"]] = {}
+# One chunk write at a time per upload in this process; a second PUT at the same
+# offset waits and then gets the usual offset mismatch.
+_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+def _meta_path(upload_id: str) -> Path:
+    return UPLOADS_PATH / f"{upload_id}.json"
+
+
+def _part_path(upload_id: str) -> Path:
+    return UPLOADS_PATH / f"{upload_id}.part"
+
+
+def load_session(upload_id: str) -> dict:
+    try:
+        uuid.UUID(hex=upload_id)
+        meta = json.loads(_meta_path(upload_id).read_text())
+        meta["offset"] = _part_path(upload_id).stat().st_size
+    except (ValueError, OSError):
+        # Includes a part file removed by a concurrent abort or completion.
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return meta
+
+
+def _digest_for(upload_id: str, size: int) -> "hashlib._Hash | None":
+    """The running digest of the part file if it still covers exactly its ``size`` bytes."""
+    hashed, modified, digest = _hashers.get(upload_id, (-1, -1, None))
+    try:
+        current = _part_path(upload_id).stat().st_mtime_ns
+    except OSError:
+        return None
+    return digest.copy() if (hashed, modified) == (size, current) else None
+
+
+def sweep_sessions(ttl_hours: float | None = None) -> int:
+    """Discard chunked uploads nobody has touched for UPLOAD_SESSION_TTL_HOURS; returns how many went."""
+    ttl = settings.upload_session_ttl_hours if ttl_hours is None else ttl_hours
+    cutoff = time.time() - ttl * 3600
+    expired = 0
+    for path in UPLOADS_PATH.glob("*.json"):
+        upload_id = path.stem
+        try:
+            touched = max(candidate.stat().st_mtime for candidate in (path, _part_path(upload_id)) if candidate.exists())
+        except (OSError, ValueError):
+            continue
+        if touched < cutoff:
+            discard(upload_id)
+            expired += 1
+    for part in UPLOADS_PATH.glob("*.part"):
+        try:
+            if not _meta_path(part.stem).exists() and part.stat().st_mtime < cutoff:
+                part.unlink()
+        except OSError:
+            continue
+    return expired
+
+
+def create_session(filename: str, size: int, folder: str | None, object_name: str | None, sha256: str | None) -> dict:
+    check_size(size)
+    UPLOADS_PATH.mkdir(parents=True, exist_ok=True)
+    sweep_sessions()
+    upload_id = uuid.uuid4().hex
+    meta = {
+        "uploadId": upload_id,
+        "filename": filename,
+        "size": size,
+        "folder": folder,
+        "objectName": object_name,
+        "sha256": sha256,
+    }
+    _meta_path(upload_id).write_text(json.dumps(meta))
+    _part_path(upload_id).touch()
+    _hashers[upload_id] = (0, _part_path(upload_id).stat().st_mtime_ns, hashlib.sha256())
+    return {**meta, "offset": 0, "chunkSize": settings.upload_chunk_bytes}
+
+
+async def write_chunk(upload_id: str, offset: int, stream) -> dict:
+    load_session(upload_id)
+    async with _locks[upload_id]:
+        meta = load_session(upload_id)
+        if offset != meta["offset"]:
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": meta["offset"]})
+        digest = _digest_for(upload_id, offset)
+        position = offset
+        try:
+            buffer = await anyio.open_file(_part_path(upload_id), "r+b")
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        async with buffer:
+            # Written at the offset rather than appended, so a chunk raced in by another
+            # worker is overwritten instead of pushing the part past its declared size.
+            await buffer.seek(offset)
+            await buffer.truncate()
+            async for chunk in stream:
+                position += len(chunk)
+                if position > meta["size"] or position - offset > settings.upload_chunk_bytes:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds declared size")
+                if digest is not None:
+                    digest.update(chunk)
+                await buffer.write(chunk)
+        if digest is not None:
+            _hashers[upload_id] = (position, _part_path(upload_id).stat().st_mtime_ns, digest)
+    return {**meta, "offset": position}
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        while chunk := fh.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def finalize(upload_id: str, db: Session) -> StoredFile:
+    meta = load_session(upload_id)
+    if meta["offset"] != meta["size"]:
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "offset": meta["offset"]})
+    part = _part_path(upload_id)
+    digest = _digest_for(upload_id, meta["size"])
+    checksum = digest.hexdigest() if digest is not None else await run_in_threadpool(_hash_file, part)
+    if meta["sha256"] and meta["sha256"].lower() != checksum:
+        discard(upload_id)
+        raise HTTPException(status_code=422, detail="Checksum mismatch")
+    stored = await run_in_threadpool(
+        commit_temp, db, part, checksum, meta["size"], meta["filename"], meta["folder"], meta["objectName"]
+    )
+    discard(upload_id)
+    return stored
+
+
+def discard(upload_id: str):
+    _hashers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+    _part_path(upload_id).unlink(missing_ok=True)
+    _meta_path(upload_id).unlink(missing_ok=True)
+
+
+class UploadLimitMiddleware:
+    """Turns away multipart uploads over MAX_UPLOAD_BYTES before the form is spooled.
+
+    ``paths`` maps an endpoint to how many files it accepts. A declared Content-Length over
+    the limit gets a 413 without reading the body; otherwise the body is counted as it
+    is received and reading stops once it passes the limit.
+    """
+
+    def __init__(self, app: ASGIApp, paths: dict[str, int]):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        files = self.paths.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if files is None:
+            return await self.app(scope, receive, send)
+        limit = files * settings.max_upload_bytes + MULTIPART_SLACK
+        detail = f"File exceeds {settings.max_upload_bytes} bytes"
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+        received = 0
+
+        async def counted() -> Message:
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                # HTTPException survives FastAPI's form parsing; anything else becomes a 400.
+                raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, counted, send)
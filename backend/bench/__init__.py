@@ -0,0 +1 @@
+"""Load and latency benchmarks for the VISUS API; run with ``python -m bench``."""
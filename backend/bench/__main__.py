@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+
+from .scenarios import SCENARIOS, Scenario
+
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Load and latency benchmarks for the VISUS API.")
+    parser.add_argument("--url", help="Benchmark a running server (e.g. http://localhost:8080) instead of app.main:app in-process")
+    parser.add_argument("--scale", choices=("small", "large"), default="small", help="Synthetic data set size for in-process runs")
+    parser.add_argument("--requests", type=int, default=500, help="Iterations per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients for scenarios without a fixed value")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured iterations per scenario")
+    parser.add_argument("--scenario", action="append", help="Run only these scenarios (repeatable)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache for in-process runs")
+    parser.add_argument("--seed-only", action="store_true", help="Seed DATABASE_URL to --scale and exit")
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Percent p99 slowdown that fails the comparison")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace):
+    """Point the app at a throwaway SQLite database and storage dir; must run before app modules are imported."""
+    workdir = tempfile.mkdtemp(prefix="visus-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["LOCAL_STORAGE_PATH"] = f"{workdir}/storage"
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+
+def seed(scale: str):
+    from app.database import Base, SessionLocal, engine
+    from app.seed import seed_synthetic
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        seed_synthetic(db, scale)
+
+
+@asynccontextmanager
+async def open_client(args: argparse.Namespace):
+    from app.config import get_settings
+
+    settings = get_settings()
+    auth = (settings.admin_username, settings.admin_password)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, auth=auth, timeout=60) as client:
+            yield client
+        return
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        seed(args.scale)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", auth=auth, timeout=60) as client:
+            yield client
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float, size: int) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(quantiles[49], 3) if latencies else 0.0,
+        "p95_ms": round(quantiles[94], 3) if latencies else 0.0,
+        "p99_ms": round(quantiles[98], 3) if latencies else 0.0,
+        "max_ms": round(max(latencies), 3) if latencies else 0.0,
+        "mb_per_s": round(size / elapsed / 1_000_000, 3) if elapsed else 0.0,
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, args: argparse.Namespace) -> dict:
+    concurrency = scenario.concurrency or args.concurrency
+    latencies: list[float] = []
+    errors = 0
+    size = 0
+
+    async def phase(iterations: range, record: bool):
+        counter = iter(iterations)
+
+        async def worker():
+            nonlocal errors, size
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    transferred = await scenario.run(client, i)
+                except Exception as exc:
+                    if record:
+                        errors += 1
+                        if errors == 1:
+                            print(f"  {scenario.name}: {exc}", file=sys.stderr)
+                    continue
+                if record:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    size += transferred
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    await phase(range(args.warmup), record=False)
+    started = time.perf_counter()
+    await phase(range(args.warmup, args.warmup + args.requests), record=True)
+    return {"concurrency": concurrency, **summarize(latencies, errors, time.perf_counter() - started, size)}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    regressed = False
+    print(f"\n{'scenario':<20} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in (*COMPARED, "rps"):
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            flag = ""
+            if metric == "p99_ms" and change > max_regression:
+                regressed, flag = True, "  REGRESSED"
+            print(f"{name:<20} {metric:<8} {before:>10} {after:>10} {change:>+7.1f}%{flag}")
+    return regressed
+
+
+def print_table(results: dict):
+    print(f"{'scenario':<20} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, row in results["scenarios"].items():
+        print(f"{name:<20} {row['concurrency']:>5} {row['rps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    selected = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    results = {
+        "target": args.url or "asgi",
+        "scale": None if args.url else args.scale,
+        "cache": not args.no_cache,
+        "requests": args.requests,
+        "python": platform.python_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "scenarios": {},
+    }
+    async with open_client(args) as client:
+        for scenario in selected:
+            results["scenarios"][scenario.name] = await run_scenario(client, scenario, args)
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            return 1 if compare(results, json.load(baseline), args.max_regression) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed_only:
+        seed(args.scale)
+        sys.exit(0)
+    if not args.url:
+        configure_environment(args)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,81 @@
+import os
+from typing import Awaitable, Callable, NamedTuple
+
+import httpx
+
+UPLOAD_BYTES = 256 * 1024
+_upload_body = os.urandom(UPLOAD_BYTES)
+
+
+class Scenario(NamedTuple):
+    name: str
+    run: Callable[[httpx.AsyncClient, int], Awaitable[int]]
+    concurrency: int | None = None
+
+
+def expect(response: httpx.Response, *codes: int) -> int:
+    """Fail the iteration unless the status is one of ``codes``; returns the body size."""
+    if response.status_code not in codes:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path} -> {response.status_code}")
+    return len(response.content)
+
+
+def get(path: str) -> Callable[[httpx.AsyncClient, int], Awaitable[int]]:
+    async def run(client: httpx.AsyncClient, i: int) -> int:
+        return expect(await client.get(path), 200)
+
+    return run
+
+
+def revalidate(path: str) -> Callable[[httpx.AsyncClient, int], Awaitable[int]]:
+    etags: dict[str, str] = {}
+
+    async def run(client: httpx.AsyncClient, i: int) -> int:
+        if path not in etags:
+            etags[path] = (await client.get(path)).headers["etag"]
+        return expect(await client.get(path, headers={"If-None-Match": etags[path]}), 304)
+
+    return run
+
+
+async def admin_doctor_crud(client: httpx.AsyncClient, i: int) -> int:
+    payload = {"name": f"Bench {i}", "role": "Врач-офтальмолог", "experienceYears": 3, "descriptionRu": "Тест", "descriptionKk": "Тест"}
+    size = expect(response := await client.post("/api/admin/doctors", json=payload), 200)
+    doctor_id = response.json()["id"]
+    size += expect(await client.put(f"/api/admin/doctors/{doctor_id}", json={**payload, "experienceYears": 4}), 200)
+    return size + expect(await client.delete(f"/api/admin/doctors/{doctor_id}"), 200, 204)
+
+
+async def upload(client: httpx.AsyncClient, i: int) -> int:
+    response = await client.post("/api/admin/upload", files={"file": (f"bench-{i}.bin", _upload_body)}, data={"folder": "bench"})
+    expect(response, 200)
+    expect(await client.delete("/api/admin/upload", params={"objectName": response.json()["path"]}), 200)
+    return UPLOAD_BYTES
+
+
+async def callback(client: httpx.AsyncClient, i: int) -> int:
+    # A distinct caller per iteration, reported by a trusted proxy (loopback), so the
+    # per-IP and per-phone limiters admit it and the insert path is what gets measured.
+    headers = {"X-Real-IP": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"}
+    payload = {"name": f"Bench {i}", "phone": f"+7 700 {i // 10000 % 1000:03d} {i % 10000:04d}"}
+    return expect(await client.post("/api/requests/callback", json=payload, headers=headers), 201, 202)
+
+
+async def callback_inbox(client: httpx.AsyncClient, i: int) -> int:
+    return expect(await client.get("/api/admin/callbacks", params={"status": "NEW", "limit": 50}), 200)
+
+
+SCENARIOS = [
+    Scenario("doctors", get("/api/doctors")),
+    Scenario("services", get("/api/services")),
+    Scenario("reviews", get("/api/reviews")),
+    Scenario("media_diagnostics", get("/api/media/diagnostics")),
+    Scenario("media_interior", get("/api/media/interior")),
+    Scenario("site_ru", get("/api/site?lang=ru")),
+    Scenario("site_kk", get("/api/site?lang=kk")),
+    Scenario("doctors_304", revalidate("/api/doctors")),
+    Scenario("callback_inbox", callback_inbox),
+    Scenario("admin_doctor_crud", admin_doctor_crud, concurrency=1),
+    Scenario("upload_256k", upload, concurrency=4),
+    Scenario("callback_burst", callback, concurrency=50),
+]
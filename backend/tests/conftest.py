@@ -0,0 +1,36 @@
+import base64
+import os
+import tempfile
+
+# Settings are read once at import, so the environment is pinned before the app is imported.
+WORKDIR = tempfile.mkdtemp(prefix="visus-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["LOCAL_STORAGE_PATH"] = f"{WORKDIR}/storage"
+os.environ["STORAGE_MODE"] = "local"
+os.environ["PUBLISH_PATH"] = ""
+os.environ["MEDIA_GC_INTERVAL"] = "0"
+os.environ["CALLBACK_WRITE_BEHIND"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def admin() -> dict:
+    return {"Authorization": "Basic " + base64.b64encode(b"admin:admin").decode()}
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
@@ -0,0 +1,93 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from app import backends
+
+BUCKET = "visus-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in {
+        "s3_bucket": BUCKET,
+        "s3_endpoint_url": None,
+        "s3_public_url": None,
+        "s3_region": "us-east-1",
+        "s3_access_key": "testing",
+        "s3_secret_key": "testing",
+    }.items():
+        monkeypatch.setattr(backends.settings, name, value)
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield backends.S3Backend()
+
+
+def upload(backend, tmp_path, key: str, data: bytes = b"data"):
+    source = tmp_path / key.replace("/", "_")
+    source.write_bytes(data)
+    backend.put(source, key)
+    assert not source.exists()
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        backends.StorageBackend()
+
+
+def test_put_exists_and_size(s3, tmp_path):
+    upload(s3, tmp_path, "doctors/a.jpg", b"12345")
+    assert s3.exists("doctors/a.jpg")
+    assert s3.size("doctors/a.jpg") == 5
+    assert s3.url("doctors/a.jpg") == f"https://{BUCKET}.s3.us-east-1.amazonaws.com/doctors/a.jpg"
+
+
+def test_misses_are_not_remembered(s3):
+    assert not s3.exists("doctors/late.jpg")
+    # Stored by another process after the first lookup.
+    boto3.client("s3", region_name="us-east-1").put_object(Bucket=BUCKET, Key="doctors/late.jpg", Body=b"x")
+    assert s3.exists("doctors/late.jpg")
+
+
+def test_remembered_keys_are_bounded(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "KNOWN_KEYS", 2)
+    for name in "abc":
+        upload(s3, tmp_path, f"media/{name}.jpg")
+    assert list(s3._known) == ["media/b.jpg", "media/c.jpg"]
+
+
+def test_presign_upload(s3):
+    post = s3.presign_upload("blobs/abc.jpg", 1024, "image/jpeg")
+    assert post["method"] == "POST"
+    assert post["key"] == "blobs/abc.jpg"
+    assert post["fields"]["key"] == "blobs/abc.jpg"
+    assert post["fields"]["Content-Type"] == "image/jpeg"
+    assert "policy" in post["fields"]
+
+
+def test_delete_removes_siblings(s3, tmp_path):
+    for key in ["doctors/a.jpg", "doctors/a.jpg.thumb.webp", "doctors/a.jpg.card.jpg", "doctors/ab.jpg"]:
+        upload(s3, tmp_path, key)
+    s3.delete("doctors/a.jpg")
+    assert not s3.exists("doctors/a.jpg")
+    assert not s3.exists("doctors/a.jpg.thumb.webp")
+    assert [item.key for item in s3.iter_objects()] == ["doctors/ab.jpg"]
+
+
+def test_remove_and_iter_objects(s3, tmp_path):
+    for key in ["media/one.jpg", "media/two.jpg", ".staging/tmp", "media/.journal/x"]:
+        upload(s3, tmp_path, key, b"abc")
+    objects = sorted(s3.iter_objects())
+    assert [(item.key, item.size) for item in objects] == [("media/one.jpg", 3), ("media/two.jpg", 3)]
+    s3.remove(["media/one.jpg", "media/missing.jpg"])
+    assert [item.key for item in s3.iter_objects()] == ["media/two.jpg"]
+
+
+def test_local_copy_and_publish_siblings(s3, tmp_path):
+    upload(s3, tmp_path, "media/photo.jpg", b"original")
+    with s3.local_copy("media/photo.jpg") as path:
+        assert path.read_bytes() == b"original"
+        path.with_name(f"{path.name}.thumb.webp").write_bytes(b"thumb")
+        s3.publish_siblings(path, "media/photo.jpg")
+    assert not path.exists()
+    assert s3.size("media/photo.jpg.thumb.webp") == 5
@@ -0,0 +1,56 @@
+import io
+
+from PIL import Image
+
+from app import models, storage
+from app.backfill import backfill
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (20, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def listed(client, path: str, item_id: int) -> dict:
+    return next(item for item in client.get(path).json() if item["id"] == item_id)
+
+
+def test_metadata_follows_the_attached_image(client, admin):
+    uploaded = client.post("/api/admin/upload", files={"file": ("poster.png", png(300, 600), "image/png")}, data={"folder": "reviews"}, headers=admin).json()
+    review = client.post("/api/admin/reviews", json={"patientName": "Постер", "posterUrl": uploaded["url"]}, headers=admin).json()
+    try:
+        assert (review["imageWidth"], review["imageHeight"]) == (300, 600)
+        assert review["imageBytes"] == (storage.BASE_PATH / uploaded["path"]).stat().st_size
+        assert review["imageColor"] == "#147828"
+        assert listed(client, "/api/reviews", review["id"])["imagePlaceholder"] == review["imagePlaceholder"]
+
+        # Pointing the row at an image nobody described clears the stale hints.
+        changed = client.put(f"/api/admin/reviews/{review['id']}", json={"patientName": "Постер", "posterUrl": "reviews/unknown.png"}, headers=admin).json()
+        assert [changed[field] for field in ("imageWidth", "imageHeight", "imageBytes", "imageColor", "imagePlaceholder")] == [None] * 5
+    finally:
+        client.delete(f"/api/admin/reviews/{review['id']}", headers=admin)
+
+
+def test_backfill_describes_existing_images_once(client, db):
+    (storage.BASE_PATH / "media").mkdir(exist_ok=True)
+    (storage.BASE_PATH / "media/backfill.png").write_bytes(png(640, 480))
+    asset = models.MediaAsset(category="interior", photo_url="media/backfill.png")
+    db.add(asset)
+    db.commit()
+    assert listed(client, "/api/media/interior", asset.id)["variants"] == {}
+    try:
+        report = backfill()
+        assert report["failed"] == 0 and report["rows"] >= 1
+
+        db.refresh(asset)
+        assert (asset.image_width, asset.image_height, asset.image_color) == (640, 480, "#147828")
+        assert db.get(models.ImageMetadata, "media/backfill.png").bytes == (storage.BASE_PATH / "media/backfill.png").stat().st_size
+        assert (storage.BASE_PATH / "media/backfill.png.thumb.webp").exists()
+        described = listed(client, "/api/media/interior", asset.id)
+        assert (described["imageWidth"], set(described["variants"])) == (640, {"thumb", "card", "full"})
+
+        assert backfill()["images"] == 0
+    finally:
+        db.delete(asset)
+        db.commit()
@@ -0,0 +1,145 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import cache
+from app.cache import change_listeners, content_versions, generation_watcher, response_cache
+from app.compression import compress
+from app.config import get_settings
+
+# Stands in for another worker, container or CLI job (transfer, backfill) sharing the database.
+REMOTE_WRITE = """
+from app.cache import mark_changed
+from app.database import SessionLocal
+
+with SessionLocal() as db:
+    mark_changed(db, "doctors")
+    db.commit()
+"""
+
+
+def test_changes_from_another_process_reach_listeners(client, monkeypatch):
+    etag = client.get("/api/doctors").headers["etag"]
+    generation = content_versions.get("doctors")[0]
+    seen: list[set[str]] = []
+    monkeypatch.setattr("app.cache.change_listeners", [*change_listeners, seen.append])
+
+    subprocess.run([sys.executable, "-c", REMOTE_WRITE], cwd=Path(__file__).parents[1], check=True)
+    generation_watcher.refresh()
+
+    assert seen == [{"doctors"}]
+    assert content_versions.get("doctors")[0] == generation + 1
+    assert client.get("/api/doctors").headers["etag"] != etag
+    # Already applied, so the next poll reports nothing.
+    generation_watcher.refresh()
+    assert seen == [{"doctors"}]
+
+
+def test_encoded_responses_compress_off_the_loop_and_revalidate(client, monkeypatch):
+    def compress_off_loop(body: bytes, encoding: str, best: bool = False) -> bytes:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return compress(body, encoding, best)
+        if best:
+            pytest.fail("compressed a cached body on the event loop")
+        return compress(body, encoding, best)
+
+    monkeypatch.setattr(get_settings(), "compression_min_bytes", 0)
+    monkeypatch.setattr(cache, "compress", compress_off_loop)
+    response_cache.clear()
+    first = client.get("/api/doctors", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"].endswith('-gzip"')
+
+    revalidated = client.get("/api/doctors", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == first.headers["etag"]
+
+
+def test_cached_bodies_are_dropped_before_new_validators_appear(client, admin, monkeypatch):
+    apply = content_versions.apply
+    cached_at_apply: list[bool] = []
+
+    def observe(rows):
+        cached_at_apply.append(response_cache.get("doctors") is not None)
+        return apply(rows)
+
+    monkeypatch.setattr(content_versions, "apply", observe)
+    client.get("/api/doctors")
+    created = client.post("/api/admin/doctors", json={"name": "Порядок", "role": "Врач"}, headers=admin).json()
+    client.get("/api/doctors")
+    subprocess.run([sys.executable, "-c", REMOTE_WRITE], cwd=Path(__file__).parents[1], check=True)
+    generation_watcher.refresh()
+    client.delete(f"/api/admin/doctors/{created['id']}", headers=admin)
+    assert cached_at_apply[:2] == [False, False]
+
+
+def test_best_ratio_only_for_bodies_that_are_kept(monkeypatch):
+    levels: list[bool] = []
+
+    def record(body: bytes, encoding: str, best: bool = False) -> bytes:
+        levels.append(best)
+        return compress(body, encoding, best)
+
+    monkeypatch.setattr(cache, "compress", record)
+    local = cache.ResponseCache(ttl=60, max_entries=4)
+    body = b"[]" * 1000
+    local.set("kept", body, ["doctors"])
+    assert asyncio.run(local.aencoded("kept", body, "gzip")) == asyncio.run(local.aencoded("kept", body, "gzip"))
+    asyncio.run(local.aencoded("uncached", body, "gzip"))
+    assert levels == [True, False]
+
+
+SERVICE = {"slug": "cache-check", "titleRu": "Осмотр", "titleKk": "Тексеру", "isActive": True}
+ADMIN_WRITES = [
+    ("doctors", "/api/doctors", "/api/admin/doctors", {"name": "Кеш", "role": "Врач"}, {"name": "Кеш", "role": "Хирург"}, "role"),
+    ("services", "/api/services", "/api/admin/services", SERVICE, {**SERVICE, "titleRu": "Повторный осмотр"}, "titleRu"),
+    ("reviews", "/api/reviews", "/api/admin/reviews", {"patientName": "Кеш", "rating": 4}, {"patientName": "Кеш", "rating": 5}, "rating"),
+    (
+        "media:diagnostics", "/api/media/diagnostics", "/api/admin/media/diagnostics",
+        {"category": "diagnostics", "title": "Кеш", "photoUrl": "media/cache.jpg"},
+        {"category": "diagnostics", "title": "Кеш 2", "photoUrl": "media/cache.jpg"},
+        "title",
+    ),
+]
+
+
+@pytest.mark.parametrize(("key", "public", "base", "payload", "changed", "field"), ADMIN_WRITES, ids=[write[0] for write in ADMIN_WRITES])
+def test_admin_writes_invalidate_cached_responses(client, admin, key, public, base, payload, changed, field):
+    unrelated = "/api/services" if key != "services" else "/api/doctors"
+    unrelated_key = unrelated.rsplit("/", 1)[-1]
+
+    def warm() -> list[dict]:
+        body = client.get(public).json()
+        client.get(unrelated)
+        client.get("/api/site")
+        assert response_cache.get(key) is not None and response_cache.get("site:ru") is not None
+        return body
+
+    def dropped():
+        assert response_cache.get(key) is None and response_cache.get("site:ru") is None
+        assert response_cache.get(unrelated_key) is not None
+
+    def shown(item_id: int) -> dict | None:
+        return next((item for item in client.get(public).json() if item["id"] == item_id), None)
+
+    warm()
+    response = client.post(base, json=payload, headers=admin)
+    assert response.status_code == 200
+    created = response.json()
+    dropped()
+    assert shown(created["id"])[field] == payload[field]
+
+    warm()
+    assert client.put(f"{base}/{created['id']}", json=changed, headers=admin).status_code == 200
+    dropped()
+    assert shown(created["id"])[field] == changed[field]
+
+    warm()
+    assert client.delete(f"{base}/{created['id']}", headers=admin).status_code == 204
+    dropped()
+    assert shown(created["id"]) is None
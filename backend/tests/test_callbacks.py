@@ -0,0 +1,62 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import delete, insert, text
+
+from app import callbacks
+from app.database import engine
+from app.models import CallbackRequest
+
+
+@pytest.fixture(autouse=True)
+def empty_inbox(client, db):
+    db.execute(delete(CallbackRequest))
+    db.commit()
+
+
+def page_ids(client, admin, limit: int) -> list[int]:
+    ids, cursor = [], None
+    for _ in range(20):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/admin/callbacks", params=params, headers=admin).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return ids
+    pytest.fail(f"Paging did not terminate: {ids}")
+
+
+def test_pages_rows_created_in_the_same_second(client, admin, db):
+    same_second = datetime(2026, 10, 17, 18, 7, 3, tzinfo=timezone.utc)
+    db.execute(insert(CallbackRequest), [{"name": f"n{i}", "phone": f"+7701000000{i}", "created_at": same_second} for i in range(5)])
+    db.commit()
+    expected = sorted((row.id for row in db.query(CallbackRequest)), reverse=True)
+
+    assert page_ids(client, admin, limit=2) == expected
+
+
+def test_pages_rows_stamped_by_the_database(client, admin, db):
+    # CURRENT_TIMESTAMP on SQLite has no fraction; startup normalizes such rows.
+    for i in range(5):
+        db.execute(text("INSERT INTO callback_requests (name, phone, status) VALUES (:name, :phone, 'NEW')"), {"name": f"n{i}", "phone": f"+7702000000{i}"})
+    db.commit()
+    callbacks.normalize_created_at(engine)
+    expected = sorted((row.id for row in db.query(CallbackRequest)), reverse=True)
+
+    assert page_ids(client, admin, limit=2) == expected
+
+
+def test_csv_export_neutralizes_formulas(client, admin, db):
+    db.execute(insert(CallbackRequest), [
+        {"name": '=HYPERLINK("http://evil","x")', "phone": "+7 701 000 0000"},
+        {"name": "Асель", "phone": "87010000000"},
+    ])
+    db.commit()
+    rows = list(csv.DictReader(io.StringIO(client.get("/api/admin/callbacks/export", headers=admin).text)))
+
+    assert sorted((row["name"], row["phone"]) for row in rows) == [
+        ("'=HYPERLINK(\"http://evil\",\"x\")", "'+7 701 000 0000"),
+        ("Асель", "87010000000"),
+    ]
@@ -0,0 +1,105 @@
+import fcntl
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+
+from app import ingest
+from app.models import CallbackRequest
+
+
+@pytest.fixture(autouse=True)
+def journal_path(client, tmp_path, monkeypatch, db):
+    monkeypatch.setattr(ingest, "JOURNAL_PATH", tmp_path)
+    db.execute(delete(CallbackRequest))
+    db.commit()
+    return tmp_path
+
+
+def stored_names(db) -> list[str]:
+    return sorted(db.scalars(select(CallbackRequest.name)))
+
+
+def test_segments_are_locked_before_they_are_visible(journal_path):
+    queue = ingest.CallbackQueue(flush_interval=60, batch_size=100, max_backlog=1000)
+    queue.start()
+    try:
+        [segment] = journal_path.glob("*.ndjson")
+        with segment.open("r") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert not list(journal_path.glob("*.tmp"))
+    finally:
+        queue.stop()
+
+
+def test_stop_leaves_unflushed_rows_for_replay(journal_path, monkeypatch, db):
+    def database_down(batch):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(ingest, "insert_rows", database_down)
+    queue = ingest.CallbackQueue(flush_interval=0.01, batch_size=100, max_backlog=1000)
+    queue.start()
+    queue.submit("Айгерим", "+77010000001")
+    stopper = threading.Thread(target=queue.stop)
+    stopper.start()
+    stopper.join(timeout=5)
+    assert not stopper.is_alive()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(ingest, "JOURNAL_PATH", journal_path)
+    ingest.replay_journals()
+    assert stored_names(db) == ["Айгерим"]
+    assert not list(journal_path.glob("*.ndjson"))
+
+
+def test_replay_skips_segments_removed_by_another_worker(journal_path, monkeypatch, db):
+    gone = journal_path / "1-gone.ndjson"
+    gone.write_text('{"name": "Нет", "phone": "+77010000002", "status": "NEW", "created_at": "2024-01-01T00:00:00+00:00"}\n')
+    real_glob = type(journal_path).glob
+
+    def listing_then_unlink(self, pattern):
+        paths = list(real_glob(self, pattern))
+        gone.unlink()
+        return paths
+
+    monkeypatch.setattr(type(journal_path), "glob", listing_then_unlink)
+    ingest.replay_journals()
+    monkeypatch.undo()
+    assert stored_names(db) == []
+
+
+def test_submit_needs_a_running_queue(journal_path):
+    queue = ingest.CallbackQueue(flush_interval=60, batch_size=100, max_backlog=1000)
+    with pytest.raises(HTTPException) as raised:
+        queue.submit("Рано", "+77010000003")
+    assert raised.value.status_code == 503
+    queue.start()
+    queue.stop()
+    with pytest.raises(HTTPException):
+        queue.submit("Поздно", "+77010000004")
+
+
+def test_backlog_is_capped_while_the_database_is_down(journal_path, monkeypatch):
+    def database_down(batch):
+        raise ConnectionError("database is down")
+
+    synced: list[int] = []
+    fsync = ingest.os.fsync
+    monkeypatch.setattr(ingest, "insert_rows", database_down)
+    monkeypatch.setattr(ingest.os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    queue = ingest.CallbackQueue(flush_interval=0.01, batch_size=100, max_backlog=3)
+    queue.start()
+    try:
+        for i in range(3):
+            queue.submit(f"n{i}", f"+7701000001{i}")
+        with pytest.raises(HTTPException) as raised:
+            queue.submit("n3", "+77010000013")
+        assert raised.value.status_code == 503
+        assert raised.value.headers["Retry-After"]
+        assert len(synced) == 3
+    finally:
+        queue.stop()
+    # The accepted rows stay journaled for replay.
+    assert sum(len(path.read_text().splitlines()) for path in journal_path.glob("*.ndjson")) == 3
@@ -0,0 +1,184 @@
+import asyncio
+import gzip
+import io
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app import main, storage
+
+
+def no_storage_lookup(key: str) -> bool:
+    pytest.fail(f"Serializing a response looked up {key} in storage")
+
+
+def test_rows_without_metadata_serialize_without_storage_lookups(client, admin, monkeypatch):
+    monkeypatch.setattr(storage.backend, "exists", no_storage_lookup)
+    created = client.post("/api/admin/doctors", json={"name": "Без метаданных", "role": "Врач", "photoUrl": "doctors/missing.jpg"}, headers=admin)
+    assert created.status_code == 200
+    assert created.json()["variants"] == {}
+
+    assert [doctor["variants"] for doctor in client.get("/api/doctors").json()] == [{}]
+    assert client.get("/api/site").status_code == 200
+    client.delete(f"/api/admin/doctors/{created.json()['id']}", headers=admin)
+
+
+def test_batch_upload_reports_errors_per_item(client, admin, monkeypatch):
+    save_upload = main.save_upload
+
+    async def flaky_save(file, folder, object_name, db):
+        if file.filename == "disk.txt":
+            raise OSError("No space left on device")
+        if file.filename == "bad.txt":
+            raise HTTPException(status_code=400, detail="Invalid file")
+        return await save_upload(file, folder, object_name, db)
+
+    monkeypatch.setattr(main, "save_upload", flaky_save)
+    response = client.post(
+        "/api/admin/upload/batch",
+        files=[("files", (name, b"hello", "text/plain")) for name in ("ok.txt", "disk.txt", "bad.txt")],
+        headers=admin,
+    )
+    assert response.status_code == 200
+    ok, disk, bad = response.json()["items"]
+    assert ok["size"] == 5 and "error" not in ok
+    assert disk == {"filename": "disk.txt", "error": "Failed to store file"}
+    assert bad == {"filename": "bad.txt", "error": "Invalid file"}
+
+
+def jpeg(width: int = 64, height: int = 48) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_variants_are_built_off_the_event_loop(client, admin, monkeypatch):
+    local_copy = storage.backend.local_copy
+
+    def copy_off_loop(key: str):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return local_copy(key)
+        pytest.fail("downloaded a stored object on the event loop")
+
+    monkeypatch.setattr(storage.backend, "local_copy", copy_off_loop)
+    response = client.post("/api/admin/upload", files={"file": ("eye.jpg", jpeg(), "image/jpeg")}, data={"folder": "doctors"}, headers=admin)
+    assert response.status_code == 200
+    assert set(response.json()["variants"]) == {"thumb", "card", "full"}
+
+
+def test_upload_builds_every_variant_and_describes_the_image(client, admin):
+    response = client.post("/api/admin/upload", files={"file": ("wide.jpg", jpeg(2000, 1000), "image/jpeg")}, data={"folder": "doctors"}, headers=admin)
+    assert response.status_code == 200
+    uploaded = response.json()
+    url, path = uploaded["url"], uploaded["path"]
+    assert uploaded["variants"] == {
+        variant: {fmt: f"{url}.{variant}.{fmt}" for fmt in ("webp", "jpg")} for variant in ("thumb", "card", "full")
+    }
+    for variant, edge in (("thumb", 320), ("card", 800), ("full", 1600)):
+        for fmt, pil_format in (("webp", "WEBP"), ("jpg", "JPEG")):
+            with Image.open(storage.BASE_PATH / f"{path}.{variant}.{fmt}") as image:
+                assert (image.format, image.size) == (pil_format, (edge, edge // 2))
+    with Image.open(storage.BASE_PATH / f"{path}.webp") as full_size:
+        assert full_size.size == (2000, 1000)
+
+    created = client.post("/api/admin/doctors", json={"name": "С фото", "role": "Врач", "photoUrl": url}, headers=admin)
+    doctor = created.json()
+    assert (doctor["imageWidth"], doctor["imageHeight"]) == (2000, 1000)
+    color = doctor["imageColor"]
+    assert all(abs(int(color[i:i + 2], 16) - channel) <= 8 for i, channel in ((1, 200), (3, 30), (5, 30)))
+    assert doctor["imagePlaceholder"].startswith("data:image/webp;base64,")
+    assert doctor["variants"] == uploaded["variants"]
+    client.delete(f"/api/admin/doctors/{doctor['id']}", headers=admin)
+
+
+def test_non_images_get_no_variants(client, admin):
+    response = client.post("/api/admin/upload", files={"file": ("notes.txt", b"plain", "text/plain")}, headers=admin)
+    assert response.status_code == 200
+    assert response.json()["variants"] == {}
+    assert not list(storage.BASE_PATH.glob(f"{response.json()['path']}.*"))
+
+
+@pytest.fixture
+def served():
+    """A few files in the store, reachable under /media/served/."""
+    folder = storage.BASE_PATH / "served"
+    folder.mkdir(exist_ok=True)
+    files = {
+        "clip.mp4": bytes(range(256)) * 4,
+        "photo.jpg": b"jpeg bytes",
+        "photo.jpg.webp": b"webp bytes",
+        "data.json": b'{"plain": true}',
+        "data.json.gz": gzip.compress(b'{"pre": "encoded"}'),
+    }
+    for name, body in files.items():
+        (folder / name).write_bytes(body)
+    yield files
+    for name in files:
+        (folder / name).unlink()
+
+
+def test_media_serves_byte_ranges(client, served):
+    clip = served["clip.mp4"]
+    partial = client.get("/media/served/clip.mp4", headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == clip[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(clip)}"
+    assert partial.headers["content-length"] == "10"
+
+    suffix = client.get("/media/served/clip.mp4", headers={"Range": "bytes=-5"})
+    assert (suffix.status_code, suffix.content) == (206, clip[-5:])
+    open_ended = client.get("/media/served/clip.mp4", headers={"Range": "bytes=1000-"})
+    assert open_ended.content == clip[1000:]
+
+    beyond = client.get("/media/served/clip.mp4", headers={"Range": f"bytes={len(clip)}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(clip)}"
+
+    # A range against a changed file (stale If-Range) or a multi-range request gets the whole file.
+    stale = client.get("/media/served/clip.mp4", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert (stale.status_code, stale.content) == (200, clip)
+    multi = client.get("/media/served/clip.mp4", headers={"Range": "bytes=0-1,4-5"})
+    assert (multi.status_code, multi.content) == (200, clip)
+
+
+def test_media_revalidates_with_304(client, served):
+    first = client.get("/media/served/clip.mp4")
+    assert first.headers["accept-ranges"] == "bytes"
+    assert first.headers["cache-control"] == f"public, max-age={storage.settings.media_max_age}"
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert client.get("/media/served/clip.mp4", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/media/served/clip.mp4", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/media/served/clip.mp4", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_media_picks_pre_encoded_siblings(client, served):
+    webp = client.get("/media/served/photo.jpg", headers={"Accept": "image/avif,image/webp,*/*"})
+    assert (webp.content, webp.headers["content-type"]) == (b"webp bytes", "image/webp")
+    assert "accept" in webp.headers["vary"].lower()
+    refused = client.get("/media/served/photo.jpg", headers={"Accept": "image/webp;q=0, */*"})
+    assert (refused.content, refused.headers["content-type"]) == (b"jpeg bytes", "image/jpeg")
+    assert client.get("/media/served/photo.jpg", headers={"Accept": "*/*"}).content == b"jpeg bytes"
+
+    gzipped = client.get("/media/served/data.json", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == b'{"pre": "encoded"}'
+    assert gzipped.headers["content-type"] == "application/json"
+    plain = client.get("/media/served/data.json", headers={"Accept-Encoding": "identity"})
+    assert plain.content == served["data.json"] and "content-encoding" not in plain.headers
+    # Ranges address the original bytes, never an encoded sibling.
+    ranged = client.get("/media/served/data.json", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-7"})
+    assert (ranged.status_code, ranged.content) == (206, served["data.json"][:8])
+
+
+def test_content_addressed_blobs_are_immutable(client):
+    blob = storage.BASE_PATH / storage.BLOB_PREFIX / "ab" / "served-blob.bin"
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    blob.write_bytes(b"blob")
+    try:
+        response = client.get(f"/media/{storage.BLOB_PREFIX}ab/served-blob.bin")
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    finally:
+        blob.unlink()
@@ -0,0 +1,66 @@
+import logging
+
+from app import metrics
+
+
+def sample(client, admin, line: str) -> float:
+    """Current value of one exposition line (``name{labels}``), 0 when it has not been reported yet."""
+    text = client.get("/metrics", headers=admin).text
+    return next((float(row.rpartition(" ")[2]) for row in text.splitlines() if row.rpartition(" ")[0] == line), 0.0)
+
+
+def test_metrics_need_admin(client):
+    assert client.get("/metrics").status_code == 401
+
+
+def test_requests_are_counted_per_route_with_queries_and_bytes(client, admin):
+    labels = '{method="GET",route="/api/admin/doctors"}'
+    handled = f'visus_http_requests_total{{method="GET",route="/api/admin/doctors",status="200"}}'
+    before = {line: sample(client, admin, line) for line in (
+        handled,
+        f"visus_http_response_size_bytes_sum{labels}",
+        f"visus_db_queries_per_request_count{labels}",
+        f"visus_db_queries_per_request_sum{labels}",
+        "visus_db_queries_total",
+    )}
+
+    body = client.get("/api/admin/doctors", headers=admin).content
+    after = {line: sample(client, admin, line) for line in before}
+
+    assert after[handled] == before[handled] + 1
+    assert after[f"visus_http_response_size_bytes_sum{labels}"] == before[f"visus_http_response_size_bytes_sum{labels}"] + len(body)
+    assert after[f"visus_db_queries_per_request_count{labels}"] == before[f"visus_db_queries_per_request_count{labels}"] + 1
+    assert after[f"visus_db_queries_per_request_sum{labels}"] >= before[f"visus_db_queries_per_request_sum{labels}"] + 1
+    assert after["visus_db_queries_total"] > before["visus_db_queries_total"]
+
+
+def test_unknown_paths_share_one_label(client, admin):
+    line = 'visus_http_requests_total{method="GET",route="unmatched",status="404"}'
+    before = sample(client, admin, line)
+    client.get("/api/no-such-route-1")
+    client.get("/api/no-such-route-2")
+    assert sample(client, admin, line) == before + 2
+
+
+def test_slow_requests_log_their_queries(client, admin, monkeypatch, caplog):
+    monkeypatch.setattr(metrics.settings, "slow_request_ms", 0.001)
+    with caplog.at_level(logging.WARNING, logger="visus.metrics"):
+        client.get("/api/admin/doctors", headers=admin)
+    [record] = [record for record in caplog.records if "/api/admin/doctors" in record.getMessage()]
+    message = record.getMessage()
+    assert message.startswith("Slow request GET /api/admin/doctors -> 200")
+    assert "SELECT" in message
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", (0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert lines[2:] == [
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1.0"} 3',
+        'demo_seconds_bucket{le="+Inf"} 4',
+        "demo_seconds_sum 4.25",
+        "demo_seconds_count 4",
+    ]
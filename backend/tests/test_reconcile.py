@@ -0,0 +1,53 @@
+from sqlalchemy import delete
+
+from app import reconcile, storage
+from app.models import Doctor, Review
+
+
+def store(key: str) -> str:
+    path = storage.BASE_PATH / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"data")
+    return key
+
+
+def test_only_one_reconciliation_holds_the_lock():
+    with reconcile.exclusive() as first:
+        assert first
+        with reconcile.exclusive() as second:
+            assert not second
+    with reconcile.exclusive() as again:
+        assert again
+
+
+def test_removes_only_unreferenced_files(client, db):
+    kept = [
+        store("gc/referenced.jpg"),
+        store("gc/referenced.jpg.thumb.webp"),
+        store("media/bare.jpg"),
+        store("gc/foreign.jpg"),
+        store("gc/mount.jpg"),
+    ]
+    orphans = [store("gc/orphan.jpg"), store("gc/orphan.jpg.thumb.webp")]
+    db.add_all([
+        Doctor(name="Ссылка", role="Врач", photo_url=storage.public_url("gc/referenced.jpg")),
+        Doctor(name="Ключ", role="Врач", photo_url="media/bare.jpg"),
+        Doctor(name="Монтирование", role="Врач", photo_url="/media/gc/mount.jpg"),
+        # Left behind by a clone from another environment or a changed LOCAL_PUBLIC_URL.
+        Doctor(name="Чужой хост", role="Врач", photo_url="https://staging.example/media/gc/foreign.jpg"),
+        Review(patient_name="Видео", rating=5, video_url='<blockquote class="instagram-media"></blockquote>'),
+    ])
+    db.commit()
+    try:
+        dry = reconcile.reconcile(dry_run=True, grace_hours=0)
+        assert dry["deleted"] == 0 and (storage.BASE_PATH / orphans[0]).exists()
+
+        report = reconcile.reconcile(dry_run=False, grace_hours=0)
+        assert report["unresolved"] == 1
+        assert report["unresolved_examples"] == ["https://staging.example/media/gc/foreign.jpg"]
+        assert all((storage.BASE_PATH / key).exists() for key in kept)
+        assert not any((storage.BASE_PATH / key).exists() for key in orphans)
+    finally:
+        db.execute(delete(Doctor))
+        db.execute(delete(Review))
+        db.commit()
@@ -0,0 +1,76 @@
+from app import main, schemas
+from app.main import VALID_MEDIA_CATEGORIES
+
+SERVICE = {
+    "slug": "site-projection",
+    "titleRu": "Консультация",
+    "titleKk": "Кеңес",
+    "shortDescriptionRu": "Только по-русски",
+    "isActive": True,
+}
+DOCTOR = {"name": "Проекция", "role": "Врач", "descriptionRu": "Описание", "descriptionKk": "Сипаттама"}
+
+
+def test_site_projects_one_language(client, admin):
+    service = client.post("/api/admin/services", json=SERVICE, headers=admin).json()
+    doctor = client.post("/api/admin/doctors", json=DOCTOR, headers=admin).json()
+    try:
+        site = client.get("/api/site", params={"lang": "kk"}).json()
+        assert set(site) == {"doctors", "services", "reviews", "media"}
+        assert set(site["media"]) == set(VALID_MEDIA_CATEGORIES)
+
+        projected = next(item for item in site["services"] if item["id"] == service["id"])
+        assert projected["titleKk"] == "Кеңес"
+        # An empty Kazakh field falls back to the Russian text rather than disappearing.
+        assert projected["shortDescriptionKk"] == "Только по-русски"
+        assert projected["fullDescriptionKk"] is None
+        assert not any(key.endswith("Ru") for key in projected)
+        assert projected["slug"] == "site-projection" and projected["isActive"] is True
+
+        russian = client.get("/api/site").json()
+        assert next(item for item in russian["doctors"] if item["id"] == doctor["id"])["descriptionRu"] == "Описание"
+        kazakh = next(item for item in site["doctors"] if item["id"] == doctor["id"])
+        assert kazakh["descriptionKk"] == "Сипаттама" and "descriptionRu" not in kazakh
+
+        # Apart from the dropped language, each section matches its own endpoint.
+        full = next(item for item in client.get("/api/services").json() if item["id"] == service["id"])
+        assert {key: value for key, value in full.items() if not key.endswith(("Ru", "Kk"))} == {
+            key: value for key, value in projected.items() if not key.endswith("Kk")
+        }
+        assert client.get("/api/site", params={"lang": "en"}).status_code == 422
+    finally:
+        client.delete(f"/api/admin/services/{service['id']}", headers=admin)
+        client.delete(f"/api/admin/doctors/{doctor['id']}", headers=admin)
+
+
+def orm_payload(db, schema, query) -> list[dict]:
+    """What the routes returned before the fast path: ORM objects validated one by one, then encoded."""
+    return [schema.model_validate(obj).model_dump(mode="json", by_alias=True) for obj in db.scalars(query)]
+
+
+def test_fast_lists_match_orm_serialization(client, admin, db):
+    created = [
+        ("doctors", client.post("/api/admin/doctors", json={**DOCTOR, "experienceYears": 12, "photoUrl": "doctors/fast.jpg"}, headers=admin).json()),
+        ("services", client.post("/api/admin/services", json={**SERVICE, "slug": "fast-path", "fullDescriptionKk": "Толық"}, headers=admin).json()),
+        ("reviews", client.post("/api/admin/reviews", json={"patientName": "Быстрый", "rating": 4, "textRu": "Спасибо"}, headers=admin).json()),
+        ("media/diagnostics", client.post("/api/admin/media/diagnostics", json={"category": "diagnostics", "photoUrl": "media/fast.jpg"}, headers=admin).json()),
+    ]
+    try:
+        lists = {
+            "doctors": (schemas.DoctorRead, main.doctors_query()),
+            "services": (schemas.ServiceRead, main.active_services_query()),
+            "reviews": (schemas.ReviewRead, main.reviews_query()),
+            "media/diagnostics": (schemas.MediaAssetRead, main.media_query("diagnostics")),
+        }
+        snapshot = main.render_snapshot(db)
+        for path, (schema, query) in lists.items():
+            expected = orm_payload(db, schema, query)
+            assert expected, path
+            response = client.get(f"/api/{path}")
+            assert response.json() == expected, path
+            assert response.headers["content-type"] == "application/json"
+            # The static snapshot is written from the same adapter, byte for byte.
+            assert snapshot[f"api/{path}"] == response.content, path
+    finally:
+        for path, item in created:
+            client.delete(f"/api/admin/{path}/{item['id']}", headers=admin)
@@ -0,0 +1,71 @@
+import pytest
+
+SERVICE = {"slug": "search-check", "titleRu": "Офтальмоскопия глазного дна", "titleKk": "Көз түбін тексеру", "shortDescriptionRu": "Расширение зрачка", "isActive": True}
+
+
+def search(client, q: str, lang: str = "ru") -> list[dict]:
+    response = client.get("/api/search", params={"q": q, "lang": lang})
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def hits(client, q: str, lang: str = "ru") -> set[tuple[str, int]]:
+    return {(result["kind"], result["id"]) for result in search(client, q, lang)}
+
+
+@pytest.fixture
+def service(client, admin):
+    created = client.post("/api/admin/services", json=SERVICE, headers=admin).json()
+    yield created
+    client.delete(f"/api/admin/services/{created['id']}", headers=admin)
+
+
+def test_words_match_as_prefixes(client, service):
+    key = ("service", service["id"])
+    assert key in hits(client, "офтальмо")
+    assert key in hits(client, "ОФТАЛЬМОСКОПИЯ ДНА")
+    # Every word has to match.
+    assert key not in hits(client, "офтальмо катаракта")
+    assert key in hits(client, "көз", "kk")
+    assert key not in hits(client, "көз")
+
+
+def test_missing_kazakh_text_falls_back_to_russian(client, service):
+    [result] = [result for result in search(client, "зрачка", "kk") if result["id"] == service["id"]]
+    assert result["title"] == "Көз түбін тексеру"
+    assert result["snippet"] == "Расширение <mark>зрачка</mark>"
+
+
+def test_admin_writes_reindex(client, admin, service):
+    key = ("service", service["id"])
+    updated = client.put(f"/api/admin/services/{service['id']}", json={**SERVICE, "titleRu": "Тонометрия"}, headers=admin)
+    assert updated.status_code == 200
+    assert key not in hits(client, "офтальмо")
+    assert key in hits(client, "тонометр")
+
+    # Hidden services drop out of the index, and come back when shown again.
+    client.put(f"/api/admin/services/{service['id']}", json={**SERVICE, "isActive": False}, headers=admin)
+    assert key not in hits(client, "офтальмо")
+    client.put(f"/api/admin/services/{service['id']}", json=SERVICE, headers=admin)
+    assert key in hits(client, "офтальмо")
+
+    doctor = client.post("/api/admin/doctors", json={"name": "Сапарова", "role": "Ретинолог"}, headers=admin).json()
+    assert ("doctor", doctor["id"]) in hits(client, "ретино")
+    client.delete(f"/api/admin/doctors/{doctor['id']}", headers=admin)
+    assert ("doctor", doctor["id"]) not in hits(client, "ретино")
+
+
+def test_highlights_escape_admin_text(client, admin):
+    review = client.post("/api/admin/reviews", json={"patientName": "<b>Жанболат</b>", "textRu": "Спасибо & <script>"}, headers=admin).json()
+    try:
+        [result] = [result for result in search(client, "жанбол") if result["id"] == review["id"]]
+        assert result["title"] == "&lt;b&gt;<mark>Жанболат</mark>&lt;/b&gt;"
+        assert result["snippet"] == "Спасибо &amp; &lt;script&gt;"
+        assert result["rank"] > 0
+    finally:
+        client.delete(f"/api/admin/reviews/{review['id']}", headers=admin)
+
+
+def test_query_syntax_is_not_interpreted(client):
+    assert search(client, '"NEAR( OR *') == []
+    assert search(client, "!!!") == []
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from app import snapshot
+from app.snapshot import SnapshotPublisher
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+class Renders:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, db) -> dict[str, bytes]:
+        with self._lock:
+            self.count += 1
+        return {"api/doctors": b"[]"}
+
+
+def test_only_the_leader_publishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "RETRY_DELAY", 0.05)
+    monkeypatch.setattr(snapshot, "SIGNAL_POLL", 0.02)
+    renders = [Renders(), Renders()]
+    publishers = [SnapshotPublisher(tmp_path, render, delay=0, keep=3) for render in renders]
+    for publisher in publishers:
+        publisher.start()
+    try:
+        wait_for(lambda: sum(render.count for render in renders) == 1)
+        leader, follower = publishers if publishers[0].leading else publishers[::-1]
+        assert not follower.leading
+        # A follower's own edit reaches the leader without any generation polling.
+        follower.request()
+        wait_for(lambda: sum(render.count for render in renders) == 2)
+        time.sleep(0.1)
+        assert follower.render.count == 0
+        assert leader.render.count == 2
+
+        # The follower takes over, with one publish, once the leader exits.
+        leader.stop()
+        wait_for(lambda: follower.leading and follower.render.count == 1)
+    finally:
+        for publisher in publishers:
+            publisher.stop()
+
+    release = tmp_path / "current" / "api"
+    assert sorted(path.name for path in release.iterdir()) == ["doctors.json", "doctors.json.gz"]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+
+from app import storage
+from app.models import StoredBlob
+
+
+@pytest.fixture
+def dedup(client, db, monkeypatch):
+    monkeypatch.setattr(storage.settings, "storage_dedup", True)
+    yield
+    db.execute(delete(StoredBlob))
+    db.commit()
+
+
+def upload(client, admin, data: bytes, name: str = "scan.jpg") -> str:
+    response = client.post("/api/admin/upload", files={"file": (name, data, "image/jpeg")}, headers=admin)
+    assert response.status_code == 200
+    return response.json()["url"]
+
+
+def ref_count(db, url: str) -> int | None:
+    db.expire_all()
+    return db.scalar(select(StoredBlob.ref_count).where(StoredBlob.path == storage.relative_path(url)))
+
+
+def age(db, url: str):
+    # As if the last upload of these bytes was longer ago than the GC grace period.
+    old = datetime.now(timezone.utc) - timedelta(hours=storage.settings.media_gc_grace_hours + 1)
+    db.execute(update(StoredBlob).where(StoredBlob.path == storage.relative_path(url)).values(uploaded_at=old))
+    db.commit()
+
+
+def test_identical_uploads_share_one_blob(client, admin, db, dedup):
+    first = upload(client, admin, b"same bytes", "a.jpg")
+    second = upload(client, admin, b"same bytes", "b.jpg")
+    assert first == second
+    assert storage.relative_path(first).startswith(storage.BLOB_PREFIX)
+    assert db.scalar(select(StoredBlob.ref_count)) == 0
+
+
+def test_retain_release_and_swap(client, admin, db, dedup):
+    first = upload(client, admin, b"first")
+    second = upload(client, admin, b"second")
+    storage.retain(db, first)
+    storage.retain(db, first)
+    storage.swap(db, first, second)
+    db.commit()
+    assert (ref_count(db, first), ref_count(db, second)) == (1, 1)
+
+    age(db, first)
+    storage.release(db, first)
+    db.commit()
+    assert ref_count(db, first) is None
+    assert not storage.backend.exists(storage.relative_path(first))
+
+
+def test_release_spares_a_blob_just_handed_to_another_upload(client, admin, db, dedup):
+    url = upload(client, admin, b"shared")
+    storage.retain(db, url)
+    db.commit()
+    age(db, url)
+    # Another admin uploads the same bytes before the last reference is dropped.
+    assert upload(client, admin, b"shared") == url
+    storage.release(db, url)
+    db.commit()
+    assert ref_count(db, url) == 0
+    assert storage.backend.exists(storage.relative_path(url))
+    storage.retain(db, url)
+    db.commit()
+    assert ref_count(db, url) == 1
+
+
+def test_retaining_a_vanished_blob_fails(client, admin, db, dedup):
+    url = upload(client, admin, b"gone")
+    db.execute(delete(StoredBlob))
+    db.commit()
+    with pytest.raises(HTTPException) as raised:
+        storage.retain(db, url)
+    assert raised.value.status_code == 409
+    db.rollback()
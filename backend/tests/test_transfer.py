@@ -0,0 +1,34 @@
+import io
+
+from sqlalchemy import select
+
+from app import reconcile, storage, transfer
+from app.models import Doctor
+
+
+def test_import_under_another_public_base_keeps_media(client, admin, db, monkeypatch):
+    source = storage.BASE_PATH / "doctors" / "clone.jpg"
+    source.parent.mkdir(parents=True, exist_ok=True)
+    source.write_bytes(b"jpeg bytes")
+    client.post(
+        "/api/admin/doctors",
+        json={"name": "Клон", "role": "Врач", "photoUrl": storage.public_url("doctors/clone.jpg")},
+        headers=admin,
+    )
+
+    archive = io.BytesIO()
+    manifest = transfer.write_archive(archive, ["doctors"], with_media=True)
+    assert manifest["public_base"] == storage.backend.public_base
+    # The target environment: an empty store served under another host.
+    source.unlink()
+    monkeypatch.setattr(storage.backend, "public_base", "https://prod.example/media")
+    archive.seek(0)
+    report = transfer.read_archive(archive, replace=True)
+    assert report["rebased"] == 1
+    assert db.scalar(select(Doctor.photo_url).where(Doctor.name == "Клон")) == "https://prod.example/media/doctors/clone.jpg"
+
+    swept = reconcile.reconcile(dry_run=False, grace_hours=0)
+    assert swept["missing"] == 0
+    assert source.read_bytes() == b"jpeg bytes"
+    db.query(Doctor).delete()
+    db.commit()
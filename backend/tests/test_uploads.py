@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from app import main, uploads
+
+DATA = b"0123456789" * 100
+
+
+def start_upload(client, admin, data: bytes = DATA) -> str:
+    response = client.post(
+        "/api/admin/uploads",
+        json={"filename": "scan.pdf", "size": len(data), "sha256": hashlib.sha256(data).hexdigest()},
+        headers=admin,
+    )
+    assert response.status_code == 201
+    return response.json()["uploadId"]
+
+
+async def slow_stream(data: bytes):
+    for start in range(0, len(data), 100):
+        await asyncio.sleep(0.001)
+        yield data[start:start + 100]
+
+
+async def race(upload_id: str, data: bytes) -> list:
+    return await asyncio.gather(
+        uploads.write_chunk(upload_id, 0, slow_stream(data)),
+        uploads.write_chunk(upload_id, 0, slow_stream(data)),
+        return_exceptions=True,
+    )
+
+
+def test_concurrent_chunks_at_one_offset_write_once(client, admin):
+    upload_id = start_upload(client, admin)
+    results = asyncio.run(race(upload_id, DATA))
+
+    assert sorted(type(result).__name__ for result in results) == ["HTTPException", "dict"]
+    assert [result.status_code for result in results if not isinstance(result, dict)] == [409]
+    assert uploads._part_path(upload_id).stat().st_size == len(DATA)
+    completed = client.post(f"/api/admin/uploads/{upload_id}/complete", headers=admin)
+    assert completed.status_code == 200
+    assert completed.json()["sha256"] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_missing_part_file_is_not_found(client, admin):
+    upload_id = start_upload(client, admin)
+    uploads._part_path(upload_id).unlink()
+    assert client.get(f"/api/admin/uploads/{upload_id}", headers=admin).status_code == 404
+    assert client.put(f"/api/admin/uploads/{upload_id}?offset=0", content=DATA, headers=admin).status_code == 404
+    uploads.discard(upload_id)
+
+
+def refuse_save(*args, **kwargs):
+    raise AssertionError("oversized upload reached the handler")
+
+
+def test_oversized_upload_is_refused_before_the_form_is_read(client, admin, monkeypatch):
+    monkeypatch.setattr(uploads.settings, "max_upload_bytes", 1024)
+    monkeypatch.setattr(main, "save_upload", refuse_save)
+    body = b"x" * (uploads.MULTIPART_SLACK + 2048)
+
+    declared = client.post("/api/admin/upload", files={"file": ("big.jpg", body, "image/jpeg")}, headers=admin)
+    assert declared.status_code == 413
+    assert declared.json() == {"detail": "File exceeds 1024 bytes"}
+
+    def stream():
+        yield b"--edge\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n\r\n"
+        for start in range(0, len(body), 4096):
+            yield body[start:start + 4096]
+        yield b"\r\n--edge--\r\n"
+
+    headers = {**admin, "Content-Type": "multipart/form-data; boundary=edge"}
+    streamed = client.post("/api/admin/upload", content=stream(), headers=headers)
+    assert streamed.status_code == 413
+
+
+def test_sweep_discards_abandoned_sessions(client, admin):
+    stale, fresh = start_upload(client, admin), start_upload(client, admin)
+    orphan = uploads.UPLOADS_PATH / "orphan.part"
+    orphan.write_bytes(DATA)
+    day_ago = time.time() - 25 * 3600
+    for path in (uploads._meta_path(stale), uploads._part_path(stale), orphan):
+        os.utime(path, (day_ago, day_ago))
+
+    assert uploads.sweep_sessions(ttl_hours=24) == 1
+
+    assert not uploads._meta_path(stale).exists() and not uploads._part_path(stale).exists()
+    assert not orphan.exists()
+    assert client.get(f"/api/admin/uploads/{fresh}", headers=admin).status_code == 200
+    uploads.discard(fresh)
@@ -8,6 +8,11 @@ interface UploadResponse {
   path: string;
 }
 
+interface BatchUploadItem extends Partial<UploadResponse> {
+  filename: string;
+  error?: string;
+}
+
 const API = import.meta.env.VITE_API_URL ?? (typeof window !== 'undefined' ? `${window.location.origin}/api` : '/api');
 
 function useAuthHeader() {
@@ -260,6 +265,40 @@ export function AdminApp() {
     }
   };
 
+  // Uploads every selected photo in one request, then creates all gallery rows in one batch.
+  const handleBulkMediaUpload = async (files?: FileList | null) => {
+    if (!header || !files?.length || !isMediaEntity(entity)) return;
+    const category = mediaCategoryMap[entity as 'mediaDiagnostics' | 'mediaInterior'];
+    const data = new FormData();
+    Array.from(files).forEach((file) => data.append('files', file));
+    data.append('folder', category);
+    try {
+      const uploadRes = await fetch(`${API}/admin/upload/batch`, {
+        method: 'POST',
+        headers: { Authorization: header },
+        body: data,
+      });
+      if (!uploadRes.ok) throw new Error(`HTTP ${uploadRes.status}`);
+      const { items } = (await uploadRes.json()) as { items: BatchUploadItem[] };
+      const uploaded = items.filter((item) => item.path);
+      const batchRes = await fetch(`${API}/admin/media/${category}/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Authorization: header },
+        body: JSON.stringify({ create: uploaded.map((item) => ({ category, title: '', description: '', photoUrl: item.path })) }),
+      });
+      if (!batchRes.ok) throw new Error(`HTTP ${batchRes.status}`);
+      const failed = items.filter((item) => item.error);
+      setMessage(
+        failed.length
+          ? `Добавлено ${uploaded.length}, ошибки: ${failed.map((item) => `${item.filename} (${item.error})`).join(', ')}`
+          : `Добавлено фото: ${uploaded.length}`,
+      );
+      loadList();
+    } catch (e) {
+      setMessage(`Ошибка: ${String(e)}`);
+    }
+  };
+
   return (
     <div style={pageStyle}>
       <header style={headerStyle}>
@@ -372,6 +411,10 @@ export function AdminApp() {
                   <Field label="Фото">
                     <div style={{ display: 'flex', flexDirection: 'column', gap: 8 }}>
                       <input type="file" accept="image/*" onChange={(e) => handleUpload(e.target.files?.[0])} />
+                      <label style={{ color: '#94a3b8', fontSize: 12 }}>
+                        Сразу несколько фото в галерею
+                        <input type="file" accept="image/*" multiple onChange={(e) => handleBulkMediaUpload(e.target.files)} />
+                      </label>
                       <input value={form.mediaUrl} onChange={(e) => setForm({ ...form, mediaUrl: e.target.value })} style={inputStyle} placeholder="например, diagnostics/photo.jpg" />
                       <MediaPreview src={toPreviewUrl(form.mediaUrl) || uploadUrl} />
                     </div>
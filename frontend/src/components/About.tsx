@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useTranslation } from 'react-i18next';
+import { imageLayoutProps, pickImageMetadata } from '../media';
 import type { FactItem, MediaAsset } from '../types';
 
 interface AboutProps {
@@ -46,6 +47,7 @@ export function About({ apiBaseUrl, onBook }: AboutProps) {
           title: item.title,
           description: item.description,
           photoUrl: item.photoUrl ?? item.photo_url ?? '',
+          ...pickImageMetadata(item),
           category: item.category ?? 'interior',
         })) as MediaAsset[];
         setPhotos(normalized);
@@ -94,6 +96,7 @@ export function About({ apiBaseUrl, onBook }: AboutProps) {
           >
             <img
               src={resolveMedia(currentPhoto?.photoUrl)}
+              {...imageLayoutProps(currentPhoto)}
               alt={currentPhoto?.title || t('about.title')}
               onClick={() => setLightbox(currentPhoto)}
             />
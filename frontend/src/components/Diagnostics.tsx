@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useTranslation } from 'react-i18next';
+import { imageLayoutProps, pickImageMetadata } from '../media';
 import type { MediaAsset } from '../types';
 
 interface DiagnosticsProps {
@@ -44,6 +45,7 @@ export function Diagnostics({ apiBaseUrl }: DiagnosticsProps) {
           title: item.title,
           description: item.description,
           photoUrl: item.photoUrl ?? item.photo_url ?? '',
+          ...pickImageMetadata(item),
           category: item.category ?? 'diagnostics',
         })) as MediaAsset[];
         setPhotos(normalized);
@@ -92,6 +94,7 @@ export function Diagnostics({ apiBaseUrl }: DiagnosticsProps) {
           >
             <img
               src={resolveMedia(currentPhoto?.photoUrl)}
+              {...imageLayoutProps(currentPhoto)}
               alt={currentPhoto?.title || t('diagnostics.title')}
               onClick={() => setLightbox(currentPhoto)}
             />
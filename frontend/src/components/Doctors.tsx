@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useTranslation } from 'react-i18next';
+import { imageLayoutProps, pickImageMetadata } from '../media';
 import type { Doctor } from '../types';
 
 interface DoctorsProps {
@@ -46,6 +47,7 @@ export function Doctors({ apiBaseUrl }: DoctorsProps) {
           descriptionRu: item.descriptionRu ?? item.description_ru ?? '',
           descriptionKk: item.descriptionKk ?? item.description_kk ?? '',
           photoUrl: item.photoUrl ?? item.photo_url ?? '',
+          ...pickImageMetadata(item),
         })) as Doctor[];
         console.debug('[Doctors] loaded', data.length, 'items');
         setDoctors(normalized);
@@ -83,6 +85,7 @@ export function Doctors({ apiBaseUrl }: DoctorsProps) {
               <div className="doctor-photo">
                 <img
                   src={resolveMedia(doctor.photoUrl)}
+                  {...imageLayoutProps(doctor)}
                   alt={doctor.name}
                   onError={(e) => {
                     e.currentTarget.src = '';
@@ -0,0 +1,26 @@
+import type { CSSProperties } from 'react';
+import type { ImageMetadata } from './types';
+
+// Intrinsic size plus a blurred placeholder painted behind the image until it loads.
+export function imageLayoutProps(meta?: ImageMetadata | null): { width?: number; height?: number; style?: CSSProperties } {
+  if (!meta?.imageWidth || !meta.imageHeight) return {};
+  return {
+    width: meta.imageWidth,
+    height: meta.imageHeight,
+    style: {
+      backgroundColor: meta.imageColor ?? undefined,
+      backgroundImage: meta.imagePlaceholder ? `url("${meta.imagePlaceholder}")` : undefined,
+      backgroundSize: 'cover',
+    },
+  };
+}
+
+export function pickImageMetadata(item: Record<string, any>): ImageMetadata {
+  return {
+    imageWidth: item.imageWidth ?? item.image_width,
+    imageHeight: item.imageHeight ?? item.image_height,
+    imageBytes: item.imageBytes ?? item.image_bytes,
+    imageColor: item.imageColor ?? item.image_color,
+    imagePlaceholder: item.imagePlaceholder ?? item.image_placeholder,
+  };
+}
@@ -10,7 +10,15 @@ export interface FactItem {
   text: string;
 }
 
-export interface Review {
+export interface ImageMetadata {
+  imageWidth?: number | null;
+  imageHeight?: number | null;
+  imageBytes?: number | null;
+  imageColor?: string | null;
+  imagePlaceholder?: string | null;
+}
+
+export interface Review extends ImageMetadata {
   id: number;
   patientName: string;
   rating: number;
@@ -25,7 +33,9 @@ export interface CallbackPayload {
   phone: string;
 }
 
-export interface Doctor {
+export type ImageVariants = Record<'thumb' | 'card' | 'full', Record<'webp' | 'jpg', string>>;
+
+export interface Doctor extends ImageMetadata {
   id: number;
   name: string;
   role: string;
@@ -33,6 +43,7 @@ export interface Doctor {
   descriptionRu?: string;
   descriptionKk?: string;
   photoUrl?: string;
+  variants?: Partial<ImageVariants>;
 }
 
 export interface ServiceApiItem {
@@ -47,10 +58,11 @@ export interface ServiceApiItem {
   isActive: boolean;
 }
 
-export interface MediaAsset {
+export interface MediaAsset extends ImageMetadata {
   id: number;
   category: string;
   title?: string;
   description?: string;
   photoUrl?: string;
+  variants?: Partial<ImageVariants>;
 }